@@ -4,21 +4,39 @@
 import os
 import sys
 import re 
+import struct
+import argparse
+import concurrent.futures # 用于批量分析时的多进程并发
+from functools import partial
 from loguru import logger
 from PIL import Image
 import piexif
-from typing import Dict, Any, Tuple
+from typing import Dict, Any, List, Tuple
 
 # --- 配置和常量 ---
 
 # 使用 loguru 配置日志，保证日志的完整性和可追踪性
 LOG_FILE = f"exif_debugger_{os.path.basename(__file__).replace('.py', '')}.log"
-logger.remove() # 移除默认配置
-# 配置控制台输出
-logger.add(sys.stderr, level="INFO", format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | {message}")
-# 配置日志文件输出
-logger.add(LOG_FILE, rotation="10 MB", level="DEBUG", encoding="utf-8")
-logger.info("--- EXIF 元数据枚举调试工具启动 ---")
+
+
+def _configure_logging(log_file: str = LOG_FILE):
+    """
+    配置 loguru 的控制台和文件输出。
+    仅在脚本入口和子进程初始化时调用，避免作为模块导入时重复注册文件 handler。
+    """
+    logger.remove() # 移除默认配置
+    # 配置控制台输出
+    logger.add(sys.stderr, level="INFO", format="<green>{time:HH:mm:ss}</green> | <level>{level: <8}</level> | {message}")
+    # 配置日志文件输出
+    logger.add(log_file, rotation="10 MB", level="DEBUG", encoding="utf-8")
+
+
+def _init_worker():
+    """
+    [多进程初始化] 每个子进程写入独立的日志文件 (按 PID 区分)，避免多个进程同时轮转同一文件。
+    """
+    _configure_logging(LOG_FILE.replace('.log', f'_{os.getpid()}.log'))
+
 
 # 用户提供的文件路径 (请确保此路径在您的系统中是有效的)
 TARGET_IMAGE_PATH = r"C:\stable-diffusion-webui\outputs\txt2img-images\2025-11-01\00001-2629889630.jpg"
@@ -28,6 +46,37 @@ EXIF_USER_COMMENT_TAG = 37510  # 0x9286
 EXIF_IMAGE_DESCRIPTION_TAG = 270 # 0x010E
 UNICODE_HEADER = b"UNICODE\x00"
 
+# JPEG 段标记常量 (用于只读取 EXIF APP1 段)
+JPEG_SOI = b"\xff\xd8"
+JPEG_APP1 = 0xE1
+JPEG_SOS = 0xDA
+JPEG_EOI = 0xD9
+JPEG_STANDALONE_MARKERS = frozenset({0x01, 0xD8} | set(range(0xD0, 0xD8))) # TEM/SOI/RSTn，无长度字段
+EXIF_SEGMENT_HEADER = b"Exif\x00\x00"
+EXIF_HEAD_READ_SIZE = 131072 # 首次读取的字节数 (128 KB)，APP0 + APP1 通常一次读完
+
+# TIFF/IFD 解析常量 (用于在 EXIF 段中直接定位 UserComment 和 ImageDescription)
+EXIF_IFD_POINTER_TAG = 34665 # 0x8769，0th IFD 中指向 Exif 子 IFD 的指针
+TIFF_TYPE_ASCII = 2
+TIFF_TYPE_SIZES = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 6: 1, 7: 1, 8: 2, 9: 4, 10: 8, 11: 4, 12: 8}
+# IFD 条目：标签 (2) + 类型 (2) + 数量 (4)，其后 4 字节为值或偏移
+_IFD_ENTRY_STRUCTS = {"<": struct.Struct("<HHI"), ">": struct.Struct(">HHI")}
+_IFD_ENTRY_SIZE = 12
+
+# 文件夹模式下收集的图片扩展名 (带 EXIF 的格式)
+ANALYZABLE_EXTENSIONS = ('.jpg', '.jpeg', '.webp')
+
+# 解码模式：fast 只执行与头部匹配的解码分支；diagnostic 枚举全部编码 (命令行 --debug-encodings 开启)
+DECODE_MODE_FAST = "fast"
+DECODE_MODE_DIAGNOSTIC = "diagnostic"
+
+# 是否总是打印 UserComment 原始字节的 repr (诊断模式下无论此开关如何都会打印)
+DEBUG_REPR_DUMP = False
+
+# SD 参数关键字 (全部为 ASCII)，以及对应的正则 (模块加载时编译一次，仅作为兜底)
+_SD_KEYWORDS = ("prompt", "steps", "sampler", "model", "negative")
+_SD_KEYWORD_RE = re.compile(r'(prompt|Steps|Sampler|model|Negative)', re.IGNORECASE)
+
 # --- 核心辅助函数：SD 参数提取 ---
 
 def extract_sd_params_from_user_comment(raw_bytes: bytes) -> Tuple[str, str]:
@@ -35,22 +84,31 @@ def extract_sd_params_from_user_comment(raw_bytes: bytes) -> Tuple[str, str]:
     [SD 参数核心提取逻辑]
     专门针对 Stable Diffusion 写入 UserComment 的特殊格式进行提取。
     策略：去除 UNICODE 头部，用 UTF-16LE 解码，然后移除所有空字节字符 (\x00)。
+    快速路径：若所有高位字节均为 0 (纯 Latin-1 范围文本)，直接取低位字节并在字节层面去除空字节，
+    再按 Latin-1 解码，结果与 UTF-16LE 解码完全一致，但避免了整串 str.replace 的扫描。
     
     返回: (解码后的原始字符串, 清洗后的 SD 参数字符串)
     """
-    # 1. 移除 UNICODE 头部
+    # 1. 移除 UNICODE 头部 (memoryview 切片不复制负载)
+    mv = memoryview(raw_bytes)
     if raw_bytes.startswith(UNICODE_HEADER):
-        data_bytes = raw_bytes[len(UNICODE_HEADER):]
-    else:
-        # 如果没有头部，则使用完整字节，但SD JPG通常应有
-        data_bytes = raw_bytes
+        mv = mv[len(UNICODE_HEADER):]
+    # 如果没有头部，则使用完整字节，但SD JPG通常应有
         
     raw_decoded_text = ""
     cleaned_text = ""
 
     try:
-        # 2. UTF-16LE 解码 (这是 SD WebUI 写入 JPG EXIF 的标准方式)
-        raw_decoded_text = data_bytes.decode('utf-16le', errors='replace')
+        # 2.1 快速路径：长度为偶数且高位字节全为 0 时，低位字节即为完整文本
+        # 高位字节判断用 bytes.count (C 循环) 完成，不在 Python 层逐字节迭代
+        if len(mv) % 2 == 0 and mv[1::2].tobytes().count(0) == len(mv) // 2:
+            low_bytes = bytes(mv[::2])
+            raw_decoded_text = low_bytes.decode('latin-1')
+            cleaned_text = low_bytes.replace(b'\x00', b'').decode('latin-1').strip()
+            return raw_decoded_text, cleaned_text
+        
+        # 2.2 UTF-16LE 解码 (这是 SD WebUI 写入 JPG EXIF 的标准方式，包含非 Latin-1 字符时使用)
+        raw_decoded_text = str(mv, 'utf-16le', 'replace') # str() 直接解码缓冲区，无需先复制为 bytes
         
         # 3. 移除空字符 (\x00) 进行清洗 (关键步骤，解决乱码/截断问题)
         cleaned_text = raw_decoded_text.replace('\x00', '').strip()
@@ -60,14 +118,42 @@ def extract_sd_params_from_user_comment(raw_bytes: bytes) -> Tuple[str, str]:
         
     return raw_decoded_text, cleaned_text
 
+def find_sd_keyword(text: str) -> str | None:
+    """
+    查找文本中最早出现的 SD 参数关键字，返回原文中的匹配片段 (保留大小写)，未找到返回 None。
+    对小写副本做多次 str.find (C 层字面量搜索)，代替逐位置尝试各分支的回溯正则。
+    """
+    lowered = text.lower()
+    # 极少数 Unicode 字符小写后长度会变化，此时下标无法对应原文，退回正则
+    if len(lowered) != len(text):
+        match = _SD_KEYWORD_RE.search(text)
+        return match.group(1) if match else None
+    
+    best_pos = -1
+    best_len = 0
+    for keyword in _SD_KEYWORDS:
+        # 只在当前最优位置之前搜索，越往后搜索范围越小
+        end = best_pos + len(keyword) if best_pos >= 0 else len(lowered)
+        pos = lowered.find(keyword, 0, end)
+        if pos >= 0 and (best_pos < 0 or pos < best_pos):
+            best_pos, best_len = pos, len(keyword)
+    
+    return text[best_pos:best_pos + best_len] if best_pos >= 0 else None
+
 # --- 核心辅助函数：解码逻辑 ---
 
-def decode_exif_bytes(tag_name: str, raw_bytes: bytes) -> Dict[str, str]:
+def decode_exif_bytes(tag_name: str, raw_bytes: bytes, mode: str = DECODE_MODE_FAST) -> Dict[str, str]:
     """
     通过枚举不同的编码方式来尝试解码原始 EXIF 字节。
+
+    mode:
+      - "fast": 检测到 UNICODE 头部时编码已确定为 UTF-16LE，只做这一次解码；
+                没有头部时编码未知，仍然走完整枚举。
+      - "diagnostic": 无论是否有头部，都枚举全部四种编码 (仅用于排查编码问题)。
     """
-    logger.debug(f"[{tag_name}] 原始字节长度: {len(raw_bytes)} 字节")
-    logger.debug(f"[{tag_name}] 原始字节 (前 50 字节): {raw_bytes[:50]!r}")
+    # 使用 loguru 的延迟格式化：级别未开启时不会构造字符串，也不会执行 repr()
+    logger.debug("[{}] 原始字节长度: {} 字节", tag_name, len(raw_bytes))
+    logger.opt(lazy=True).debug("[{}] 原始字节 (前 50 字节): {}", lambda: tag_name, lambda: repr(raw_bytes[:50]))
     
     decoding_results = {}
     
@@ -77,6 +163,10 @@ def decode_exif_bytes(tag_name: str, raw_bytes: bytes) -> Dict[str, str]:
         raw_decoded, _ = extract_sd_params_from_user_comment(raw_bytes)
         decoding_results['EXIF_STANDARD (UTF-16LE)'] = raw_decoded
         logger.info(f"[{tag_name}] 尝试 1 (标准): 成功解码为 UTF-16LE。")
+        
+        # 快速模式：头部已确定编码，其余三种解码仅用于诊断，直接跳过
+        if mode == DECODE_MODE_FAST:
+            return decoding_results
     # 如果不是 UserComment，或者没有 UNICODE 头部，则使用完整字节进行 UTF-8 等尝试
     else:
         # 尝试标准 UTF-16LE 解码
@@ -117,30 +207,154 @@ def decode_exif_bytes(tag_name: str, raw_bytes: bytes) -> Dict[str, str]:
     return decoding_results
 
 
+# --- 核心辅助函数：EXIF 段读取 ---
+
+def _read_exif_segment(fh) -> bytes | None:
+    """
+    从已打开的 JPEG 文件中只读取 EXIF APP1 段 (以 b'Exif\x00\x00' 开头的负载)，不读取后面的图像扫描数据。
+    返回的字节可以直接交给 piexif.load；不是 JPEG 或未找到 EXIF 段时返回 None。
+    """
+    head = fh.read(EXIF_HEAD_READ_SIZE)
+    if head[:2] != JPEG_SOI:
+        return None
+    
+    offset = 2
+    while True:
+        # 标记头 (2 字节) + 段长度 (2 字节) 不完整时继续读取
+        if offset + 4 > len(head):
+            more = fh.read(EXIF_HEAD_READ_SIZE)
+            if not more:
+                return None
+            head += more
+            continue
+        
+        if head[offset] != 0xFF:
+            return None # 段结构异常
+        marker = head[offset + 1]
+        if marker == 0xFF:
+            offset += 1 # 填充字节
+            continue
+        if marker in JPEG_STANDALONE_MARKERS:
+            offset += 2 # 无长度字段的独立标记
+            continue
+        if marker in (JPEG_SOS, JPEG_EOI):
+            return None # 已到图像数据，之后不会再有 APP1
+        
+        end = offset + 2 + int.from_bytes(head[offset + 2:offset + 4], 'big')
+        if marker == JPEG_APP1:
+            if end > len(head):
+                head += fh.read(end - len(head))
+            segment = head[offset + 4:end]
+            if segment.startswith(EXIF_SEGMENT_HEADER):
+                return segment
+        offset = end
+
+
+def _read_sd_tags(exif_segment: bytes) -> Dict[str, bytes | None]:
+    """
+    在 EXIF 段 (b'Exif\x00\x00' + TIFF 数据) 中只查找 ImageDescription 和 UserComment 两个标签，
+    跳过其余标签、缩略图等全部内容，不做 piexif.load 的完整解析。
+    返回值与 piexif 一致：ASCII 类型去掉末尾的空字节，其他类型返回原始字节；未找到为 None。
+    数据结构异常时抛出 ValueError / struct.error，由调用方退回 piexif。
+    """
+    tiff = exif_segment[len(EXIF_SEGMENT_HEADER):]
+    byte_order = tiff[:2]
+    if byte_order == b"II":
+        endian = "<"
+    elif byte_order == b"MM":
+        endian = ">"
+    else:
+        raise ValueError(f"未知的 TIFF 字节序: {byte_order!r}")
+    entry_struct = _IFD_ENTRY_STRUCTS[endian]
+    offset_struct = struct.Struct(endian + "I")
+    
+    def find_entries(ifd_offset: int, wanted: set) -> Dict[int, Tuple[int, int, int]]:
+        """扫描一个 IFD，返回 {标签: (类型, 数量, 值字段偏移)}，只保留需要的标签。"""
+        (entry_count,) = struct.unpack_from(endian + "H", tiff, ifd_offset)
+        found = {}
+        entry_offset = ifd_offset + 2
+        for _ in range(entry_count):
+            tag, value_type, count = entry_struct.unpack_from(tiff, entry_offset)
+            if tag in wanted:
+                found[tag] = (value_type, count, entry_offset + 8)
+                if len(found) == len(wanted):
+                    break
+            entry_offset += _IFD_ENTRY_SIZE
+        return found
+    
+    def read_value(entry: Tuple[int, int, int]) -> bytes:
+        value_type, count, value_offset = entry
+        length = count * TIFF_TYPE_SIZES.get(value_type, 1)
+        if length > 4:
+            (value_offset,) = offset_struct.unpack_from(tiff, value_offset)
+        if value_offset + length > len(tiff):
+            raise ValueError("标签数据超出 EXIF 段范围")
+        value = tiff[value_offset:value_offset + length]
+        return value[:-1] if value_type == TIFF_TYPE_ASCII else value
+    
+    (ifd0_offset,) = offset_struct.unpack_from(tiff, 4)
+    ifd0 = find_entries(ifd0_offset, {EXIF_IMAGE_DESCRIPTION_TAG, EXIF_IFD_POINTER_TAG})
+    
+    user_comment = None
+    if EXIF_IFD_POINTER_TAG in ifd0:
+        (exif_ifd_offset,) = offset_struct.unpack_from(tiff, ifd0[EXIF_IFD_POINTER_TAG][2])
+        exif_ifd = find_entries(exif_ifd_offset, {EXIF_USER_COMMENT_TAG})
+        if EXIF_USER_COMMENT_TAG in exif_ifd:
+            user_comment = read_value(exif_ifd[EXIF_USER_COMMENT_TAG])
+    
+    description = read_value(ifd0[EXIF_IMAGE_DESCRIPTION_TAG]) if EXIF_IMAGE_DESCRIPTION_TAG in ifd0 else None
+    
+    return {
+        "UserComment": user_comment,
+        "ImageDescription": description
+    }
+
+
 # --- 主分析函数 ---
 
-def analyze_exif_metadata(image_path: str):
+def analyze_exif_metadata(image_path: str, decode_mode: str = DECODE_MODE_FAST):
     """
     读取文件，提取 EXIF 元数据并进行枚举解码分析。
+    decode_mode 透传给 decode_exif_bytes，默认使用快速模式。
     """
-    if not os.path.exists(image_path):
+    # 直接打开文件，由 FileNotFoundError 判断文件是否存在 (省去一次单独的 exists 检查)
+    try:
+        fh = open(image_path, 'rb')
+    except FileNotFoundError:
         logger.error(f"文件不存在: {image_path}")
         return
 
     logger.info(f"正在分析文件: {image_path}")
     
     try:
-        # 1. 使用 piexif 加载 EXIF 数据
-        exif_dict = piexif.load(image_path)
+        # 1. 只读取 EXIF APP1 段，避免读取整张图片
+        with fh:
+            exif_data = _read_exif_segment(fh)
+            is_exif_segment = exif_data is not None
+            if not is_exif_segment:
+                # 非 JPEG (如 WebP) 或未找到 APP1 段：从同一句柄读取完整内容，不再重复打开文件
+                fh.seek(0)
+                exif_data = fh.read()
         
-        if not exif_dict:
-            logger.error("文件中未找到 EXIF 元数据。")
-            return
+        # 1.1 EXIF 段直接定位两个目标标签；失败或非 JPEG 时使用 piexif 完整解析
+        tags_to_analyze = None
+        if is_exif_segment:
+            try:
+                tags_to_analyze = _read_sd_tags(exif_data)
+            except (ValueError, struct.error) as e:
+                logger.warning(f"EXIF 段快速解析失败，改用 piexif 完整解析: {e}")
+        
+        if tags_to_analyze is None:
+            exif_dict = piexif.load(exif_data)
+            
+            if not exif_dict:
+                logger.error("文件中未找到 EXIF 元数据。")
+                return
 
-        tags_to_analyze = {
-            "UserComment": (exif_dict.get("Exif", {}).get(EXIF_USER_COMMENT_TAG)),
-            "ImageDescription": (exif_dict.get("0th", {}).get(EXIF_IMAGE_DESCRIPTION_TAG))
-        }
+            tags_to_analyze = {
+                "UserComment": (exif_dict.get("Exif", {}).get(EXIF_USER_COMMENT_TAG)),
+                "ImageDescription": (exif_dict.get("0th", {}).get(EXIF_IMAGE_DESCRIPTION_TAG))
+            }
 
         # 2. 遍历并分析每个重要标签
         for tag_name, raw_data in tags_to_analyze.items():
@@ -155,7 +369,7 @@ def analyze_exif_metadata(image_path: str):
                 continue
             
             # 执行枚举解码
-            results = decode_exif_bytes(tag_name, raw_data)
+            results = decode_exif_bytes(tag_name, raw_data, mode=decode_mode)
             
             logger.info(f"标签 {tag_name} 完整解码结果:")
             best_match = None
@@ -169,7 +383,7 @@ def analyze_exif_metadata(image_path: str):
                     # 仅对长度大于50的文本进行正则搜索，避免短小非SD参数的误报
                     if len(text) > 50: 
                         # 使用 ASCII 关键字进行匹配，此步骤通常失败，仅用于演示编码问题
-                        is_sd_params_match = re.search(r'(prompt|Steps|Sampler|model|Negative)', text, re.IGNORECASE | re.DOTALL)
+                        is_sd_params_match = find_sd_keyword(text)
                 
                 if is_sd_params_match:
                     is_sd_params = "是 (!!!)"
@@ -179,7 +393,7 @@ def analyze_exif_metadata(image_path: str):
                 logger.info(f"  > 解码方式: {method:<25} | 是否包含 SD 参数: {is_sd_params}")
                 
                 if is_sd_params == "是 (!!!)":
-                    logger.success(f"  >>> 成功提取信息 (匹配到关键词: '{is_sd_params_match.group(1)}') (前500字符):\n{text[:500]}...")
+                    logger.success(f"  >>> 成功提取信息 (匹配到关键词: '{is_sd_params_match}') (前500字符):\n{text[:500]}...")
 
             # 4. **针对 UserComment 的最终提取和打印 (核心逻辑)**
             if tag_name == 'UserComment':
@@ -187,16 +401,18 @@ def analyze_exif_metadata(image_path: str):
                 # 4.1 原始字节打印 (用于调试空字符问题)
                 raw_bytes_data = raw_data
                 if raw_bytes_data.startswith(UNICODE_HEADER):
-                    data_bytes = raw_bytes_data[len(UNICODE_HEADER):]
+                    data_bytes = memoryview(raw_bytes_data)[len(UNICODE_HEADER):] # 零拷贝切片
                     logger.info(f"UserComment 字节数据已移除 UNICODE 头部。剩余长度: {len(data_bytes)} 字节。")
                 else:
                     data_bytes = raw_bytes_data
                     logger.warning("UserComment 字节数据未检测到 UNICODE 头部。")
                 
-                logger.critical(f"\n{'='*20} UserComment 原始字节数据 (REPR，前1024字节) {'='*20}")
-                # 使用 repr() 打印字节串的原始表示，以便看到所有 \x00
-                logger.critical(repr(data_bytes[:1024])) 
-                logger.critical(f"{'='*20} UserComment 原始字节数据 (REPR，结束) {'='*20}\n")
+                # 原始字节 repr 会生成数 KB 的字符串，仅在开启 DEBUG_REPR_DUMP 或诊断模式时打印
+                if DEBUG_REPR_DUMP or decode_mode == DECODE_MODE_DIAGNOSTIC:
+                    logger.critical(f"\n{'='*20} UserComment 原始字节数据 (REPR，前1024字节) {'='*20}")
+                    # 使用 repr() 打印字节串的原始表示，以便看到所有 \x00
+                    logger.critical(repr(bytes(data_bytes[:1024]))) 
+                    logger.critical(f"{'='*20} UserComment 原始字节数据 (REPR，结束) {'='*20}\n")
                 
                 # 4.2 调用新的 SD 参数提取函数 (使用抽象后的核心逻辑)
                 _, cleaned_text = extract_sd_params_from_user_comment(raw_data)
@@ -228,8 +444,55 @@ def analyze_exif_metadata(image_path: str):
     logger.info("--- 分析完成 ---")
 
 
+# --- 批量分析 ---
+
+def collect_image_paths(paths: List[str]) -> List[str]:
+    """
+    展开输入路径：文件原样保留，文件夹则递归收集其中的 JPG/JPEG/WebP 文件。
+    """
+    image_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, files in os.walk(path):
+                for file in files:
+                    if file.lower().endswith(ANALYZABLE_EXTENSIONS):
+                        image_paths.append(os.path.join(root, file))
+        else:
+            image_paths.append(path)
+    return image_paths
+
+
+def analyze_many(paths: List[str], workers: int | None = None, decode_mode: str = DECODE_MODE_FAST):
+    """
+    使用多进程批量分析多个文件，摊薄解释器启动、loguru 配置和 piexif 导入的固定开销。
+    每个子进程的日志写入独立文件 (见 _init_worker)。
+    """
+    workers = workers or os.cpu_count() or 4
+    logger.info(f"批量分析 {len(paths)} 个文件，使用 {workers} 个进程。")
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        # 消费迭代器以等待全部任务完成，并让子进程中的异常在此处抛出
+        list(executor.map(partial(analyze_exif_metadata, decode_mode=decode_mode), paths, chunksize=8))
+
+
 if __name__ == "__main__":
-    analyze_exif_metadata(TARGET_IMAGE_PATH)
+    _configure_logging()
+    logger.info("--- EXIF 元数据枚举调试工具启动 ---")
+    
+    parser = argparse.ArgumentParser(description="EXIF 元数据枚举调试工具")
+    parser.add_argument("paths", nargs="*", default=[TARGET_IMAGE_PATH], help="要分析的图片文件或文件夹 (文件夹会递归收集 JPG/WebP)")
+    # --debug-encodings: 枚举全部编码进行诊断 (默认只执行与头部匹配的解码)
+    parser.add_argument("--debug-encodings", action="store_true", help="枚举全部编码进行诊断")
+    parser.add_argument("--workers", type=int, default=None, help="批量分析时的进程数 (默认 CPU 核心数)")
+    args = parser.parse_args()
+    
+    mode = DECODE_MODE_DIAGNOSTIC if args.debug_encodings else DECODE_MODE_FAST
+    image_paths = collect_image_paths(args.paths)
+    if len(image_paths) == 1:
+        analyze_exif_metadata(image_paths[0], decode_mode=mode)
+    elif image_paths:
+        analyze_many(image_paths, workers=args.workers, decode_mode=mode)
+    else:
+        logger.warning("未找到可分析的图片文件。")
     
     # 自动打开日志文件，方便检查结果
     log_abs_path = os.path.abspath(LOG_FILE)
@@ -1,13 +1,80 @@
 import os
-import platform
+import sys
 import time
 import ctypes
 import re
+import functools
+import concurrent.futures # 批量修改时间戳时使用线程池
 from ctypes import wintypes
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# 匹配文件名中的时间串：\d{8}_\d{6} 匹配 YYYYMMDD_HHMMSS (模块加载时编译一次)
+_TS_RE = re.compile(r'(\d{8}_\d{6})')
+
+# 定宽格式指令及其宽度 (按 datetime 构造参数的顺序排列)
+_FIXED_WIDTH_DIRECTIVES = {'Y': 4, 'm': 2, 'd': 2, 'H': 2, 'M': 2, 'S': 2}
+# 已生成的解析函数，按格式串缓存
+_PARSERS: Dict[str, Callable[[str], float]] = {}
 
 # --- 核心功能 1：时间解析（读取） ---
+def _make_parser(time_format: str) -> Callable[[str], float]:
+    """
+    根据格式串生成专用解析函数。
+    对只由 %Y%m%d%H%M%S (各出现一次) 和普通字符组成的定宽格式 (如默认的 '%Y%m%d_%H%M%S')，
+    预先计算每个字段的切片位置，解析时直接切片 + int() 构造 datetime，不再让 strptime 每次重新解析格式串。
+    其他格式退回 datetime.strptime。
+    """
+    def parse_with_strptime(time_string: str) -> float:
+        return datetime.strptime(time_string, time_format).timestamp()
+    
+    fields = {}
+    literals = []
+    pos = 0
+    i = 0
+    while i < len(time_format):
+        ch = time_format[i]
+        if ch == '%':
+            directive = time_format[i + 1:i + 2]
+            if directive not in _FIXED_WIDTH_DIRECTIVES or directive in fields:
+                return parse_with_strptime
+            width = _FIXED_WIDTH_DIRECTIVES[directive]
+            fields[directive] = slice(pos, pos + width)
+            pos += width
+            i += 2
+        else:
+            literals.append((pos, ch))
+            pos += 1
+            i += 1
+    if len(fields) != len(_FIXED_WIDTH_DIRECTIVES):
+        return parse_with_strptime
+    
+    total_len = pos
+    y, mo, d, h, mi, sec = (fields[k] for k in _FIXED_WIDTH_DIRECTIVES)
+    
+    def parse_fixed(time_string: str) -> float:
+        if len(time_string) != total_len or any(time_string[p] != c for p, c in literals):
+            raise ValueError(f"时间字符串 '{time_string}' 与格式 '{time_format}' 不匹配")
+        # 非数字字段由 int() 抛出 ValueError，超出范围的日期时间由 datetime() 抛出 ValueError，与 strptime 行为一致
+        return datetime(
+            int(time_string[y]), int(time_string[mo]), int(time_string[d]),
+            int(time_string[h]), int(time_string[mi]), int(time_string[sec])
+        ).timestamp()
+    
+    return parse_fixed
+
+@functools.lru_cache(maxsize=8192)
+def _parse_time_string(time_string: str, time_format: str) -> float:
+    """
+    将时间字符串解析为 Unix 时间戳，结果按 (时间串, 格式) 缓存。
+    批量生成的文件常常共享同一时间串，缓存可以省去重复解析；未命中缓存时使用按格式生成的专用解析函数。
+    解析失败时抛出 ValueError (异常不会被缓存)。
+    """
+    parser = _PARSERS.get(time_format)
+    if parser is None:
+        parser = _PARSERS[time_format] = _make_parser(time_format)
+    return parser(time_string)
+
 def parse_time_from_filename(filename: str, time_format: str = "%Y%m%d_%H%M%S") -> Optional[float]:
     """
     尝试从文件名中提取时间字符串，并转换为Unix时间戳。
@@ -20,21 +87,13 @@ def parse_time_from_filename(filename: str, time_format: str = "%Y%m%d_%H%M%S")
     Returns:
         Optional[float]: 提取到的Unix时间戳，如果解析失败则返回 None。
     """
-    # 计算期望的时间字符串长度（例如 YYYYMMDD_HHMMSS 是 15 位）
-    expected_len = len(time_format.replace('%', '').replace('_', '')) + time_format.count('_')
-    
-    # 构建一个匹配数字串的正则表达式
-    # \d{8}_\d{6} 匹配 YYYYMMDD_HHMMSS
-    pattern = r'(\d{8}_\d{6})' 
-    
-    match = re.search(pattern, filename)
+    match = _TS_RE.search(filename)
     
     if match:
         time_string = match.group(1)
         try:
-            dt_object = datetime.strptime(time_string, time_format)
-            # print(f"文件名: {filename} -> 提取时间: {dt_object}") # 模块中不再使用 logger
-            return dt_object.timestamp()
+            # print(f"文件名: {filename} -> 提取时间: {time_string}") # 模块中不再使用 logger
+            return _parse_time_string(time_string, time_format)
         except ValueError:
             # print(f"时间字符串 '{time_string}' 解析失败。")
             return None
@@ -42,34 +101,145 @@ def parse_time_from_filename(filename: str, time_format: str = "%Y%m%d_%H%M%S")
         # print(f"文件名: {filename} -> 未找到匹配格式的时间串。")
         return None
 
+def parse_times_from_filenames(filenames: Iterable[str], time_format: str = "%Y%m%d_%H%M%S") -> List[Optional[float]]:
+    """
+    批量版本的 parse_time_from_filename，用于遍历大目录时一次性解析大量文件名。
+
+    Args:
+        filenames (Iterable[str]): 要解析的文件名序列。
+        time_format (str): 文件名中时间字符串的格式，默认是 'YYYYMMDD_HHMMSS'。
+
+    Returns:
+        List[Optional[float]]: 与输入顺序一一对应的Unix时间戳，解析失败的位置为 None。
+    """
+    # 将正则搜索和缓存解析绑定为局部变量，省去循环中每次的全局/属性查找
+    search = _TS_RE.search
+    parse = _parse_time_string
+    results = []
+    append = results.append
+    for filename in filenames:
+        match = search(filename)
+        if match is None:
+            append(None)
+            continue
+        try:
+            append(parse(match.group(1), time_format))
+        except ValueError:
+            append(None)
+    return results
+
 # --- Windows FILETIME 转换（内部工具） ---
-def _unix_time_to_filetime(unix_time: float) -> wintypes.FILETIME:
+class _FILE_BASIC_INFO(ctypes.Structure):
     """
-    将Unix时间戳转换为Windows FILETIME结构体。
+    Windows FILE_BASIC_INFO 结构体 (模块加载时定义一次)。
+    时间字段为 FILETIME 的 64 位整数形式，取值 0 表示保持原值不变。
     """
-    class FILETIME(ctypes.Structure):
-        _fields_ = [
-            ("dwLowDateTime", wintypes.DWORD),
-            ("dwHighDateTime", wintypes.DWORD),
-        ]
+    _fields_ = [
+        ("CreationTime", wintypes.LARGE_INTEGER),
+        ("LastAccessTime", wintypes.LARGE_INTEGER),
+        ("LastWriteTime", wintypes.LARGE_INTEGER),
+        ("ChangeTime", wintypes.LARGE_INTEGER),
+        ("FileAttributes", wintypes.DWORD),
+    ]
+
+# Windows API 常量
+FILE_WRITE_ATTRIBUTES = 0x0100
+OPEN_EXISTING = 3
+# FILE_FLAG_BACKUP_SEMANTICS (0x02000000) 允许访问目录句柄并修改时间戳
+FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+# FILE_INFO_BY_HANDLE_CLASS 中的 FileBasicInfo
+FILE_BASIC_INFO_CLASS = 0
+# 声明 restype 为 HANDLE 后，INVALID_HANDLE_VALUE (-1) 会以无符号整数返回，这里按同样方式换算
+INVALID_HANDLE_VALUE = wintypes.HANDLE(-1).value
+
+# 平台在导入时判断一次 (sys.platform 是常量，不像 platform.system() 每次调用都要执行函数并比较字符串)
+_IS_WINDOWS = sys.platform == "win32"
+
+# 预先声明 kernel32 函数原型 (仅 Windows)，避免每次调用时的属性查找和参数类型推断。
+# 使用独立的 WinDLL 实例，不影响其他模块共享的 ctypes.windll.kernel32。
+if _IS_WINDOWS:
+    _kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+    
+    _CreateFileW = _kernel32.CreateFileW
+    _CreateFileW.argtypes = [wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+                             wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE]
+    _CreateFileW.restype = wintypes.HANDLE
+    
+    _SetFileInformationByHandle = _kernel32.SetFileInformationByHandle
+    _SetFileInformationByHandle.argtypes = [wintypes.HANDLE, ctypes.c_int, wintypes.LPVOID, wintypes.DWORD]
+    _SetFileInformationByHandle.restype = wintypes.BOOL
     
+    _CloseHandle = _kernel32.CloseHandle
+    _CloseHandle.argtypes = [wintypes.HANDLE]
+    _CloseHandle.restype = wintypes.BOOL
+
+def _unix_time_to_filetime(unix_time: float) -> int:
+    """
+    将Unix时间戳转换为Windows FILETIME的64位整数值 (自 1601/1/1 起的 100 纳秒间隔数)。
+    """
     # 116444736000000000: 1601/1/1 到 1970/1/1 的 100 纳秒间隔数
-    ft_val = int((unix_time * 10000000) + 116444736000000000)
-    file_time = FILETIME()
-    file_time.dwLowDateTime = ft_val & 0xFFFFFFFF
-    file_time.dwHighDateTime = ft_val >> 32
-    return file_time
+    return int((unix_time * 10000000) + 116444736000000000)
+
+def _set_file_basic_info(file_path: str, mtime: Optional[float], ctime: Optional[float]) -> bool:
+    """
+    [仅 Windows] 打开一次文件句柄，通过 SetFileInformationByHandle(FileBasicInfo) 一次性写入
+    创建时间、访问时间和修改时间。传入 None 的时间保持不变。
+    """
+    info = _FILE_BASIC_INFO()
+    if ctime is not None:
+        info.CreationTime = _unix_time_to_filetime(ctime)
+    if mtime is not None:
+        info.LastAccessTime = info.LastWriteTime = _unix_time_to_filetime(mtime)
+    
+    handle = _CreateFileW(
+        file_path, FILE_WRITE_ATTRIBUTES, 0, None, OPEN_EXISTING, FILE_FLAG_BACKUP_SEMANTICS, None
+    )
+    if not handle or handle == INVALID_HANDLE_VALUE:
+        return False
+    try:
+        return bool(_SetFileInformationByHandle(
+            handle, FILE_BASIC_INFO_CLASS, ctypes.byref(info), ctypes.sizeof(info)
+        ))
+    finally:
+        _CloseHandle(handle)
 
 # --- 核心功能 2：修改文件时间戳（写入） ---
-def modify_file_timestamps(file_path: str, new_timestamp: float, set_mtime: bool = True, set_ctime: bool = False) -> bool:
+def _verify_mtime(file_path: str, new_timestamp: float) -> bool:
+    """
+    写入后通过 os.stat 校验 mtime 是否与目标时间一致 (允许小于1秒的误差)。
     """
-    修改单个文件的修改时间(mtime)、访问时间(atime)和创建时间(ctime)。
+    try:
+        stat_info = os.stat(file_path)
+        # 允许小于1秒的误差
+        if abs(stat_info.st_mtime - new_timestamp) < 1:
+             return True
+        else:
+             # print("时间戳修改验证失败：修改后的mtime与目标时间不匹配。")
+             return False
+    except Exception:
+        # print("验证文件时间戳时发生错误。")
+        return False
+
+def _modify_windows(
+    file_path: str, 
+    new_timestamp: float, 
+    set_mtime: bool = True, 
+    set_ctime: bool = False, 
+    verify: bool = False, 
+    ctime_timestamp: Optional[float] = None
+) -> bool:
+    """
+    修改单个文件的修改时间(mtime)、访问时间(atime)和创建时间(ctime)。[Windows 实现]
 
     Args:
         file_path (str): 文件的完整路径。
         new_timestamp (float): 目标Unix时间戳。
         set_mtime (bool): 是否修改修改时间(mtime)和访问时间(atime)。
         set_ctime (bool): 是否修改创建时间(ctime) (仅Windows有效)。
+        verify (bool): 是否在写入后再执行一次 os.stat 校验 mtime。默认关闭：写入调用未报错即表示写入成功，
+                       批量调用方可在全部处理完后统一校验，避免每个文件多一次系统调用。
+        ctime_timestamp (Optional[float]): 创建时间使用的Unix时间戳，默认与 new_timestamp 相同。
+                                           用于在一次调用 (Windows 上为一次打开句柄) 中同时写入不同的 mtime 和 ctime。
 
     Returns:
         bool: 时间戳修改是否成功。
@@ -78,62 +248,99 @@ def modify_file_timestamps(file_path: str, new_timestamp: float, set_mtime: bool
     if new_timestamp <= 0.0:
         # print("新的时间戳无效。")
         return False
+    
+    if ctime_timestamp is None:
+        ctime_timestamp = new_timestamp
+    
+    # 1. 一次打开句柄，用 FILE_BASIC_INFO 同时写入 ctime/atime/mtime
+    written = False
+    if set_mtime or set_ctime:
+        try:
+            written = _set_file_basic_info(
+                file_path,
+                new_timestamp if set_mtime else None,
+                ctime_timestamp if set_ctime else None,
+            )
+        except Exception:
+            # print(f"Windows API 修改时间戳过程中发生错误。")
+            written = False # 退回 os.utime，创建时间允许修改失败
         
-    # 1. 修改访问时间(atime)和修改时间(mtime) (跨平台)
+    # 2. 上一步失败时，用 os.utime 修改访问时间(atime)和修改时间(mtime) 作为后备
     try:
-        if set_mtime:
+        if set_mtime and not written:
             # os.utime 同时设置 mtime 和 atime
             os.utime(file_path, (new_timestamp, new_timestamp))
             
     except Exception:
         # print(f"修改 mtime/atime 失败。")
         return False
+
+    # 3. 验证结果 (仅在 verify=True 时执行，且仅验证被设置的时间戳，mtime最可靠)
+    if set_mtime and verify:
+        return _verify_mtime(file_path, new_timestamp)
     
-    # 2. 尝试修改创建时间(ctime) (仅限Windows)
-    if platform.system() == "Windows" and set_ctime:
-        try:
-            # 定义Windows API所需常量
-            GENERIC_WRITE = 0x40000000
-            OPEN_EXISTING = 3
-            # FILE_FLAG_BACKUP_SEMANTICS (0x02000000) 允许访问目录句柄并修改时间戳
-            FILE_FLAG_BACKUP_SEMANTICS = 0x02000000 
-            
-            handle = ctypes.windll.kernel32.CreateFileW(
-                file_path, GENERIC_WRITE, 0, None, OPEN_EXISTING, FILE_FLAG_BACKUP_SEMANTICS, None 
-            )
+    # 未要求校验、只设置 ctime (或两者都没设置) 时返回 True，时间戳的最终验证在外部 (image_processor_and_converter.py) 进行。
+    return True
 
-            if handle != -1:
-                new_filetime = _unix_time_to_filetime(new_timestamp)
-                
-                # 调用 SetFileTime 函数，参数 2, 3, 4 分别是 CreationTime, LastAccessTime, LastWriteTime
-                # 只有 CreationTime 传值，其他传 None
-                ctypes.windll.kernel32.SetFileTime(
-                    handle, ctypes.byref(new_filetime), None, None # 只设置 Creation Time
-                )
-                
-                ctypes.windll.kernel32.CloseHandle(handle)
+def _modify_posix(
+    file_path: str, 
+    new_timestamp: float, 
+    set_mtime: bool = True, 
+    set_ctime: bool = False, 
+    verify: bool = False, 
+    ctime_timestamp: Optional[float] = None
+) -> bool:
+    """
+    修改单个文件的修改时间(mtime)和访问时间(atime)。[非 Windows 实现]
+    参数与返回值同 _modify_windows；创建时间无法修改，set_ctime 和 ctime_timestamp 被忽略。
+    """
+    
+    if new_timestamp <= 0.0:
+        # print("新的时间戳无效。")
+        return False
         
-        except Exception:
-            # print(f"Windows API 修改创建时间过程中发生错误。")
-            pass # 不影响主结果，允许失败
+    # 1. 修改访问时间(atime)和修改时间(mtime)
+    try:
+        if set_mtime:
+            # os.utime 同时设置 mtime 和 atime
+            os.utime(file_path, (new_timestamp, new_timestamp))
+            
+    except Exception:
+        # print(f"修改 mtime/atime 失败。")
+        return False
 
-    # 3. 验证结果 (仅验证被设置的时间戳，mtime最可靠)
-    if set_mtime:
-        try:
-            stat_info = os.stat(file_path)
-            # 允许小于1秒的误差
-            if abs(stat_info.st_mtime - new_timestamp) < 1:
-                 return True
-            else:
-                 # print("时间戳修改验证失败：修改后的mtime与目标时间不匹配。")
-                 return False
-        except Exception:
-            # print("验证文件时间戳时发生错误。")
-            return False
+    # 2. 验证结果 (仅在 verify=True 时执行)
+    if set_mtime and verify:
+        return _verify_mtime(file_path, new_timestamp)
     
-    # 如果只设置 ctime (或两者都没设置)，则返回 True，因为 ctime 验证在外部 (image_processor_and_converter.py) 进行。
     return True
 
+# 导入时按平台绑定实现，调用时不再有平台判断分支
+modify_file_timestamps = _modify_windows if _IS_WINDOWS else _modify_posix
+
+
+def modify_many(pairs: Iterable[Tuple[str, float]], workers: int = 16, **kwargs) -> List[bool]:
+    """
+    使用线程池批量修改多个文件的时间戳。
+    时间戳写入是 I/O 密集型操作 (ctypes 调用 Win32 API 和 os.utime 期间都会释放 GIL)，线程即可并发。
+
+    Args:
+        pairs (Iterable[Tuple[str, float]]): (文件路径, 目标Unix时间戳) 序列。
+        workers (int): 线程数，默认 16。
+        **kwargs: 透传给 modify_file_timestamps 的其他参数 (如 set_mtime, set_ctime, verify)。
+
+    Returns:
+        List[bool]: 与输入顺序一一对应的修改结果。
+    """
+    pairs = list(pairs)
+    if not pairs:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(
+            lambda pair: modify_file_timestamps(pair[0], pair[1], **kwargs), 
+            pairs
+        ))
+
 
 # --- 示例用法 (可选，但有助于验证独立性) ---
 if __name__ == "__main__":
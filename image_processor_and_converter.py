@@ -4,15 +4,26 @@
 import os
 import re
 import sys
+import time
 import warnings 
-import pandas as pd
 import concurrent.futures # 导入 concurrent.futures 模块，用于实现线程池/进程池
+import multiprocessing # 用于 freeze_support，保证 PyInstaller 打包后进程池可用
+import contextlib
+import functools
+import io
 import shutil # 新增：导入 shutil 用于文件复制（失败恢复机制）
-from PIL import Image, ImageFile, ExifTags
+import struct
+import zlib
+from PIL import Image, ImageFile, ExifTags, features
+# 显式注册本工具用到的三种格式插件：Image.open/save 在 preinit 阶段只自动加载 BMP/GIF/JPEG/PPM/PNG，
+# WebP 不在其中，第一次打开或保存 WebP 时会触发 Image.init() 导入全部 40 多个插件；提前导入 WebP 插件即可避免。
+# (不修改 Image._initialized 等私有状态，其他格式仍可按需回退到 init() 识别。)
+from PIL import JpegImagePlugin, PngImagePlugin, WebPImagePlugin  # noqa: F401
+from collections import deque
 from datetime import datetime
-from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE # 导入用于清理非法字符的正则
-from typing import List, Dict, Any 
-from tqdm import tqdm 
+from typing import List, Dict, Any, Tuple 
+# openpyxl 和 tqdm 只在主进程生成报告/显示进度时使用，在使用处延迟导入：
+# 以 spawn 方式启动的每个工作进程都会重新导入本模块，顶层导入会让每个工作进程都加载这两个用不到的库 (openpyxl 的导入尤其慢)。
 from loguru import logger 
 
 # TODO 还是debug测试能不能生成webp，测试应该算是比较成功。【已完成】
@@ -28,26 +39,100 @@ import file_timestamp_tools # 新增：导入时间戳工具模块
 EXIF_USER_COMMENT_TAG = 37510 
 # EXIF ImageDescription 标签 ID (0x010E)
 EXIF_IMAGE_DESCRIPTION_TAG = 270 
+# 0th IFD 中指向 Exif IFD 的指针标签 ID (0x8769)
+EXIF_IFD_POINTER_TAG = 34665
+# EXIF 标准 UserComment 的 Unicode 字符集头部 (与 piexif.helper.UserComment 一致，其后为 UTF-16BE 文本)
+USER_COMMENT_UNICODE_HEADER = b"UNICODE\x00"
+
+# --- 固定结构 EXIF 模板 (与 piexif.dump 对同样两个标签的输出逐字节一致) ---
+# 大端 TIFF 头，0th IFD 紧随其后 (偏移 8)
+_EXIF_TIFF_HEADER = b"Exif\x00\x00MM\x00\x2a\x00\x00\x00\x08"
+_TIFF_HEADER_LENGTH = 8
+# 0th IFD: 条目数(2) + ImageDescription 和 Exif 指针两个条目(12*2) + 下一个 IFD 偏移(4)
+_ZEROTH_IFD_LENGTH = 2 + 2 * 12 + 4
+# Exif IFD: 条目数(2) + UserComment 条目(12)；piexif 不为 Exif IFD 写下一个 IFD 偏移
+_EXIF_IFD_LENGTH = 2 + 12
+_IFD_COUNT_AND_ENTRY = struct.Struct(">HHHI") # 条目数 + 标签/类型/数量
+_IFD_ENTRY = struct.Struct(">HHII") # 标签/类型/数量/值
+_TIFF_TYPE_ASCII = 2
+_TIFF_TYPE_LONG = 4
+_TIFF_TYPE_UNDEFINED = 7
 # ---------------------------------------------
 
 
 # 允许 Pillow 加载截断的图像文件，避免程序崩溃。
 ImageFile.LOAD_TRUNCATED_IMAGES = True
 
+# Excel (XML) 不支持的控制字符删除表，与 openpyxl 的 ILLEGAL_CHARACTERS_RE ([\x00-\x08\x0b-\x0c\x0e-\x1f]) 等价：
+# 删除 0x00-0x1F 中除 \t \n \r 以外的字符。
+# 纯 ASCII 文本用 str.translate (有 ASCII 快速路径)；含非 ASCII 字符时 translate 会逐字符查字典，反而慢一个数量级，改用等价正则。
+_ILLEGAL_CHARS_TABLE = dict.fromkeys(c for c in range(0x20) if c not in (0x09, 0x0A, 0x0D))
+_ILLEGAL_CHARS_RE = re.compile(r'[\x00-\x08\x0b-\x0c\x0e-\x1f]')
+
+# PNG 文件签名和可能存放 'parameters' 的文本块类型
+_PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+_PNG_TEXT_CHUNKS = frozenset({b'tEXt', b'iTXt', b'zTXt'})
+_PNG_CHUNK_HEADER = struct.Struct('>I4s') # 块长度 + 块类型
+# 'parameters' 文本块的关键字前缀 (关键字 + 分隔符 \0)；其他文本块只读这几个字节即可判断并跳过
+_PNG_PARAMETERS_PREFIX = b'parameters\x00'
+# 直接读取时，'parameters' 文本块累计读入的字节上限 (与 Pillow 的文本总量上限相同)；超过后回退到 Pillow。
+# IDAT/IEND 以及被跳过的其他块 (包括很大的 ComfyUI 'workflow' 文本块) 只 seek 不读取，不计入此上限。
+_PNG_TEXT_READ_LIMIT = PngImagePlugin.MAX_TEXT_MEMORY
+
+# process_single_image 支持的图片扩展名 (小写)
+_IMAGE_EXTENSIONS = frozenset({'.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp'})
+
+# _ensure_dir 已创建 (或确认存在) 的目录
+_CREATED_DIRS = set()
+
+# _format_local_date 的缓存: 15 分钟区间序号 -> "YYYY-MM-DD"
+_LOCAL_DATE_CACHE: Dict[int, str] = {}
+
 # 全局变量，用于在警告处理函数中访问当前处理的文件路径
 _current_processing_file = None
 
 # 定义最大并发进程数 (通常是CPU核心数)
 MAX_WORKERS = os.cpu_count() or 4
+# 每个进程任务包含的文件数，以及批内后台线程预读的文件数
+CONVERSION_BATCH_SIZE = 8
+PREFETCH_DEPTH = 2
+# 每个工作进程缓存的 EXIF 字节条数 (同一批 SD 任务/XYZ 图常有大量完全相同的生成信息)
+EXIF_BYTES_CACHE_SIZE = 64
+# 同时提交到进程池、尚未取回结果的批次数上限 (完成一批再补交一批，避免一次性为全部文件创建 Future)
+MAX_IN_FLIGHT_BATCHES = 4 * MAX_WORKERS
 
-# 配置 Loguru (符合用户对日志的要求)
-# 日志文件记录 ERROR 级别的信息
-logger.add("image_processor_error.log", rotation="10 MB", level="ERROR", encoding="utf-8")
-# 默认的控制台输出级别设置为 INFO
-# **改动点：将控制台输出级别设置为 INFO，只输出重要信息和进度条，以精简控制台输出。**
-logger.configure(handlers=[
-    {"sink": sys.stdout, "level": "INFO"} # 级别调整为 INFO，只输出重要信息和进度条配合
-])
+# 错误日志文件路径
+ERROR_LOG_FILE = "image_processor_error.log"
+
+
+def _configure_logging():
+    """
+    配置 Loguru (符合用户对日志的要求)。在主程序入口调用一次。
+    两个 sink 都使用 enqueue=True：日志记录先放入多进程队列，由主进程的后台线程统一写出。
+    工作进程通过 _init_worker_logging 改用主进程的 logger，所有进程的记录都汇总到这一个写入线程，
+    不会出现多个进程同时写 (以及轮转) 同一个日志文件，工作进程也不必等待控制台/文件 I/O。
+    注意：logger.configure(handlers=...) 会移除已有的全部 sink，文件 sink 必须和控制台 sink 一起在这里声明。
+    逐文件的 logger.debug 均以 "{}" 占位符传参而非 f-string：所有 sink 级别都高于 DEBUG 时，loguru 在格式化消息之前就直接返回。
+    """
+    logger.configure(handlers=[
+        # 默认的控制台输出级别设置为 INFO
+        # **改动点：将控制台输出级别设置为 INFO，只输出重要信息和进度条，以精简控制台输出。**
+        # backtrace/diagnose 关闭：记录异常时不向上展开调用栈、不逐帧打印变量值 (变量中常有很长的提示词)
+        {"sink": sys.stdout, "level": "INFO", "enqueue": True, "backtrace": False, "diagnose": False}, # 级别调整为 INFO，只输出重要信息和进度条配合
+        # 日志文件记录 ERROR 级别的信息
+        {"sink": ERROR_LOG_FILE, "rotation": "10 MB", "level": "ERROR", "encoding": "utf-8", "enqueue": True,
+         "backtrace": False, "diagnose": False},
+    ])
+
+
+def _init_worker_logging(parent_logger):
+    """
+    进程池 initializer：让工作进程中的本模块函数改用主进程传入的 logger。
+    Windows 以 spawn 方式启动工作进程，不会继承主进程配置的 sink；传入的 logger 携带 enqueue 队列，
+    工作进程中的记录经队列送回主进程写出 (loguru 文档推荐的多进程用法)。
+    """
+    global logger
+    logger = parent_logger
 
 
 # --- 正向提示词的停用词列表 (用于提取核心词) ---
@@ -71,6 +156,19 @@ POSITIVE_PROMPT_STOP_WORDS = [
     r"dynamic angle,, dutch_angle, tinker bell \(pixiv 10956015\),, masterpiece, best quality, amazing quality, very awa,absurdres,newest,very aesthetic,depth of field,",
     "very awa,absurdres,newest,very aesthetic,depth of field,",
 ]
+# 停用词合并为一个预编译的交替正则 (模块加载时编译一次)，每张图片只需一次扫描；
+# 分支按列表顺序排列，较长的整行词组在前。使用时需先在提示词首尾各补一个空格 (见阶段 4)。
+# 对以 ", " 分隔的正常提示词，结果与原来逐个词组替换相同；只有词组之间不带分隔符直接相连，
+# 删掉一个词组后才拼出另一个词组时，原来的逐个替换会多删一次，单次扫描不会。
+# 注意：词组中的 "\(" 是 A1111 提示词里对括号的转义，属于原文的一部分；re.escape 后按字面匹配 "\(" 两个字符。
+_STOP_WORDS_RE = re.compile("|".join(re.escape(w) for w in POSITIVE_PROMPT_STOP_WORDS), re.IGNORECASE)
+# 连续空白折叠
+_WS_RE = re.compile(r'\s+')
+
+# --- SD 元数据解析用的正则 (模块加载时编译一次，避免每张图片重复查找/编译) ---
+# 更严格的正则，用于最终验证是否是有效的SD参数
+_SD_VALIDATE_RE = re.compile(r'Steps: \d+, Sampler: [\w\s]+', re.DOTALL)
+_MODEL_RE = re.compile(r'Model: ([^,]+)')
 # ------------------------------------------------------
 
 
@@ -92,25 +190,59 @@ def custom_warning_formatter(message, category, filename, lineno, file=None, lin
 warnings.formatwarning = custom_warning_formatter
 
 
+def _flatten_newlines(text: str) -> str:
+    """
+    把 \n 和 \r 各自替换为一个空格并去掉首尾空白，得到单行的元数据字符串。
+    保持两次 str.replace：它们走 C 层的 memchr 快速路径，比单遍 str.translate 更快 (后者遇到非 ASCII 文本会逐字符查表)。
+    """
+    return text.replace('\n', ' ').replace('\r', ' ').strip()
+
+
+def _strip_illegal_chars(text: str) -> str:
+    """删除 Excel (XML) 不支持的控制字符 (规则见 _ILLEGAL_CHARS_TABLE 处的说明)。"""
+    if text.isascii():
+        return text.translate(_ILLEGAL_CHARS_TABLE)
+    return _ILLEGAL_CHARS_RE.sub('', text)
+
+
+def _format_local_date(timestamp: float) -> str:
+    """
+    将时间戳格式化为本地日期字符串 "YYYY-MM-DD"，按 15 分钟区间缓存。
+    所有时区偏移和夏令时切换都以 15 分钟为单位对齐，同一区间内的本地日期必然相同；
+    同一批文件的创建时间大多集中在少数几天，缓存命中率很高，省去逐文件的 datetime 构造和 strftime 解析。
+    """
+    bucket = int(timestamp) // 900
+    date_str = _LOCAL_DATE_CACHE.get(bucket)
+    if date_str is None:
+        t = time.localtime(bucket * 900)
+        date_str = f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d}"
+        _LOCAL_DATE_CACHE[bucket] = date_str
+    return date_str
+
+
+def _format_local_datetime(timestamp: float) -> str:
+    """将时间戳格式化为本地时间字符串 "YYYY-MM-DD HH:MM:SS" (与 datetime.fromtimestamp().strftime 相同的输出)。"""
+    t = time.localtime(timestamp)
+    return f"{t.tm_year:04d}-{t.tm_mon:02d}-{t.tm_mday:02d} {t.tm_hour:02d}:{t.tm_min:02d}:{t.tm_sec:02d}"
+
+
 def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
     """
     处理单个图片文件，提取元数据并返回结构化数据。
+    公开接口：转换流程不再调用本函数 (元数据一致性改为直接比对写入的字符串)，保留供外部脚本扫描 PNG/JPG/WebP 的 SD 信息。
     """
     global _current_processing_file 
 
-    image_extensions = ('.png', '.jpg', '.jpeg', '.gif', '.bmp', '.webp')
-    
-    if not os.path.exists(absolute_path) or not absolute_path.lower().endswith(image_extensions):
+    # 只对扩展名做小写比较，不为整条绝对路径分配小写副本；先判扩展名再 stat，省去不支持文件的 stat
+    extension = os.path.splitext(absolute_path)[1].lower()
+    if extension not in _IMAGE_EXTENSIONS:
+        return None
+    # 一次 stat 同时完成存在性检查和创建时间读取 (原先 exists 与 getctime 各 stat 一次)
+    try:
+        stat_info = os.stat(absolute_path)
+    except (OSError, ValueError):
         return None 
     
-    # 定义 Stable Diffusion 元数据信息的正则表达式模式
-    sd_full_info_pattern = re.compile(
-        r'.*?(?:masterpiece|score_\d|1girl|BREAK|Negative prompt:|Steps:).*?(?:Version:.*?|Module:.*?|)$',
-        re.DOTALL # 允许.匹配换行符
-    )
-    # 定义一个更严格的正则，用于最终验证是否是有效的SD参数
-    sd_validation_pattern = re.compile(r'Steps: \d+, Sampler: [\w\s]+', re.DOTALL)
-    
     # 初始化变量
     containing_folder_absolute_path = os.path.abspath(os.path.dirname(absolute_path))
     sd_info = "没有扫描到生成信息"
@@ -129,18 +261,29 @@ def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
     try:
         # --- 获取文件创建日期 ---
         try:
-            creation_time = os.path.getctime(absolute_path)
-            dt_object = datetime.fromtimestamp(creation_time)
-            creation_date_dir = dt_object.strftime("%Y-%m-%d")
+            creation_date_dir = _format_local_date(stat_info.st_ctime)
         except Exception:
             pass 
         
         # --- 阶段 1: 开始图像元数据提取 ---
-        with Image.open(absolute_path) as img:
-            logger.debug(f"正在尝试提取文件: {absolute_path}, 格式: {img.format}")
+        # PNG 优先直接读取 'parameters' 文本块；能确定结果时无需 Image.open
+        png_parameters = None
+        if extension == '.png':
+            try:
+                png_parameters = _read_png_parameters(absolute_path)
+            except Exception as e:
+                logger.debug("直接读取 PNG 文本块失败，回退到 Pillow: {}: {}", absolute_path, e)
+        
+        with (contextlib.nullcontext() if png_parameters is not None else Image.open(absolute_path)) as img:
+            logger.debug("正在尝试提取文件: {}, 格式: {}", absolute_path, img.format if img else 'PNG (直接读取文本块)')
 
+            # 1.0 PNG 文本块已直接读取
+            if png_parameters is not None:
+                raw_metadata_string = png_parameters.strip()
+                logger.debug("直接从 PNG 'parameters' 文本块提取到元数据。")
+            
             # 1.1 PNG 格式：从 'parameters' 字段提取
-            if "png" in img.format.lower() and "parameters" in img.info:
+            elif "png" in img.format.lower() and "parameters" in img.info:
                 raw_metadata_string = img.info["parameters"]
                 # 增强清理：移除首尾空白字符
                 if raw_metadata_string:
@@ -150,7 +293,17 @@ def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
             # 1.2 JPEG/WebP 格式：从 EXIF/ImageDescription 提取
             elif "jpeg" in img.format.lower() or "webp" in img.format.lower():
                 if hasattr(img, '_getexif'):
-                    exif_data = img._getexif()
+                    # 只取需要的两个标签，不再用 _getexif() 把 0th/Exif/GPS 全部标签合并成一个大字典：
+                    # getexif() 只解析 0th IFD，get_ifd 再单独解析 Exif 子 IFD。
+                    # 顺序与 _getexif() 合并结果一致：先 0th 的 ImageDescription，后 Exif IFD 的 UserComment。
+                    exif = img.getexif()
+                    exif_data = {}
+                    if EXIF_IMAGE_DESCRIPTION_TAG in exif:
+                        exif_data[EXIF_IMAGE_DESCRIPTION_TAG] = exif[EXIF_IMAGE_DESCRIPTION_TAG]
+                    if ExifTags.IFD.Exif in exif:
+                        user_comment = exif.get_ifd(ExifTags.IFD.Exif).get(EXIF_USER_COMMENT_TAG)
+                        if user_comment is not None:
+                            exif_data[EXIF_USER_COMMENT_TAG] = user_comment
                     if exif_data:
                         # 0x9286: UserComment, 0x010E: ImageDescription
                         # 遍历 UserComment 和 ImageDescription 标签
@@ -178,7 +331,7 @@ def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
                                         # Fallback: 兼容性解码 (兼容非标准的元数据，包括 ImageDescription 的 UTF-8/Latin-1)
                                         # 尝试 UTF-8 解码，如果失败尝试 latin-1
                                         decoded_value = value.decode('utf-8', errors='ignore')
-                                        if not re.search(r'Steps:', decoded_value):
+                                        if 'Steps:' not in decoded_value:
                                             decoded_value = value.decode('latin-1', errors='ignore')
                                         raw_metadata_string = decoded_value
                                         # 增强清理：移除首尾空白字符
@@ -189,12 +342,12 @@ def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
                                     elif isinstance(value, str):
                                         raw_metadata_string = value
                                     
-                                    if raw_metadata_string and re.search(r'Steps:', raw_metadata_string):
-                                        logger.debug(f"从 {img.format} EXIF 标签 {hex(tag)} 提取到元数据。")
+                                    if raw_metadata_string and 'Steps:' in raw_metadata_string:
+                                        logger.debug("从 {} EXIF 标签 {} 提取到元数据。", img.format, hex(tag))
                                         break
                                     elif raw_metadata_string:
                                         # 如果是 ImageDescription，可能不是完整 SD 字符串，但也要记录
-                                        logger.debug(f"从 {img.format} EXIF 标签 {hex(tag)} 提取到非 SD 格式元数据。")
+                                        logger.debug("从 {} EXIF 标签 {} 提取到非 SD 格式元数据。", img.format, hex(tag))
 
                                 except Exception as e:
                                     logger.warning(f"EXIF 解码失败 for tag {hex(tag)}: {e}")
@@ -203,62 +356,56 @@ def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
             # --- 阶段 2: 清理并使用更强大的正则表达式提取有效信息 ---
             if isinstance(raw_metadata_string, str) and raw_metadata_string:
                 # 移除 Excel 不支持的非法 XML 字符
-                cleaned_string = ILLEGAL_CHARACTERS_RE.sub(r'', raw_metadata_string)
+                cleaned_string = _strip_illegal_chars(raw_metadata_string)
                 
                 # 清理非标准头部，以防旧的非标准写入
                 if cleaned_string.startswith("UNICODE"):
                     # 此时 raw_metadata_string 已经被 strip() 过，但为了保险，这里使用 lstrip() 清理内部头部
                     cleaned_string = cleaned_string[len("UNICODE"):].lstrip() 
                 
-                # 尝试使用 SD 信息块正则表达式捕获
-                match = sd_full_info_pattern.search(cleaned_string)
-                
-                if match:
-                    extracted_text = match.group(0).strip() 
-                    # 再次使用更严格的正则验证
-                    if sd_validation_pattern.search(extracted_text):
-                        sd_info = extracted_text
-                        sd_info_no_newlines = sd_info.replace('\n', ' ').replace('\r', ' ').strip()
-                        logger.debug("SD信息块成功通过验证和切割。")
+                # 原通用模式 r'.*?(?:masterpiece|...|Steps:).*?(?:Version:.*?|Module:.*?|)$' 从位置 0 起
+                # 总是匹配到字符串末尾，命中时等价于整个字符串；而严格验证本身要求出现 "Steps:"，
+                # 通用模式的关键字检查必然满足。因此直接取整串，先用 str 查找 "Steps:" 预筛，
+                # 避免通用模式在不含关键字的长文本上逐位置回溯 (近似平方复杂度)。
+                # 严格验证还要求出现 "Sampler:"，同样先用 str 查找排除，大多数非 SD 文本无需启动正则。
+                extracted_text = cleaned_string.strip()
+                if ('Steps:' in extracted_text and 'Sampler:' in extracted_text
+                        and _SD_VALIDATE_RE.search(extracted_text)):
+                    sd_info = extracted_text
+                    sd_info_no_newlines = _flatten_newlines(sd_info)
+                    logger.debug("SD信息块成功通过验证和切割。")
                         
-                        # --- 阶段 3: 切割信息 ---
-                        other_settings_match = re.search(r'(Steps:.*)', sd_info_no_newlines, re.DOTALL)
-                        if other_settings_match:
-                            other_settings = other_settings_match.group(1).strip()
-                            temp_sd_info = sd_info_no_newlines[:other_settings_match.start()].strip()
-                        else:
-                            temp_sd_info = sd_info_no_newlines.strip()
+                    # --- 阶段 3: 切割信息 ---
+                    # 按首个 "Steps:" 切出其他设置，再按首个 "Negative prompt:" 切分正/负面提示词。
+                    # 两处都只取第一次出现的位置，str.partition 一次查找即可得到与原正则相同的切分结果。
+                    temp_sd_info, steps_sep, other_settings = sd_info_no_newlines.partition("Steps:")
+                    if steps_sep:
+                        other_settings = (steps_sep + other_settings).strip()
+                    temp_sd_info = temp_sd_info.strip()
 
-                        negative_prompt_match = re.search(r'(Negative prompt:.*?)(?=\s*Steps:|$)', temp_sd_info, re.DOTALL)
-                        if negative_prompt_match:
-                            negative_prompt = negative_prompt_match.group(1).replace("Negative prompt:", "").strip()
-                            positive_prompt = temp_sd_info[:negative_prompt_match.start()].strip()
-                        else:
-                            positive_prompt = temp_sd_info.strip()
+                    positive_prompt, negative_sep, negative_prompt = temp_sd_info.partition("Negative prompt:")
+                    positive_prompt = positive_prompt.strip()
+                    if negative_sep:
+                        negative_prompt = negative_prompt.replace("Negative prompt:", "").strip()
                         
-                        positive_prompt_word_count = len(positive_prompt)
+                    positive_prompt_word_count = len(positive_prompt)
 
-                    else:
-                        sd_info = "没有扫描到生成信息"
-                        sd_info_no_newlines = "没有扫描到生成信息"
-                        logger.debug("SD信息块未通过严格验证。")
                 else:
                     sd_info = "没有扫描到生成信息"
                     sd_info_no_newlines = "没有扫描到生成信息"
-                    logger.debug("未匹配到 SD 信息块的通用模式。")
+                    logger.debug("SD信息块未通过严格验证。")
 
             # --- 阶段 4: 提取正向提示词的核心词 ---
-            core_positive_prompt = positive_prompt
-            for word in POSITIVE_PROMPT_STOP_WORDS:
-                core_positive_prompt = f" {core_positive_prompt} "
-                core_positive_prompt = re.sub(re.escape(word), " ", core_positive_prompt, flags=re.IGNORECASE)
+            # 首尾补一个空格再替换：部分词组以 ", " 结尾，而 positive_prompt 已去掉末尾空白，
+            # 不补空格时位于提示词末尾的词组 (例如以 "missile228," 结尾) 无法匹配 (原逐词替换每次都会补空格)
+            core_positive_prompt = _STOP_WORDS_RE.sub(" ", f" {positive_prompt} ")
             
             core_positive_prompt = core_positive_prompt.strip()
-            core_positive_prompt = re.sub(r'\s+', ' ', core_positive_prompt)
+            core_positive_prompt = _WS_RE.sub(' ', core_positive_prompt)
             if not core_positive_prompt:
                 core_positive_prompt = "核心词为空"
                 
-            model_match = re.search(r'Model: ([^,]+)', other_settings)
+            model_match = _MODEL_RE.search(other_settings)
             if model_match:
                 model_name = model_match.group(1).strip()
 
@@ -288,33 +435,149 @@ def process_single_image(absolute_path: str) -> Dict[str, Any] | None:
 def get_png_files(folder_path: str) -> List[str]:
     """
     扫描指定文件夹及其子文件夹，收集所有 PNG 文件的绝对路径。
+    公开接口：转换流程直接使用 _scan_png_entries (需要 DirEntry 的 stat 信息)，本函数保留供外部脚本使用。
     """
-    png_files = []
-    for root, dirs, files in os.walk(folder_path):
-        if '.bf' in dirs:
-            logger.warning(f"发现并跳过文件夹: {os.path.join(root, '.bf')}")
-            dirs.remove('.bf')
-            
-        for file in files:
-            if file.lower().endswith('.png'):
-                png_files.append(os.path.abspath(os.path.join(root, file)))
-    return png_files
+    return [entry.path for entry in _scan_png_entries(folder_path)]
+
+
+def _scan_png_entries(folder_path: str) -> List[os.DirEntry]:
+    """
+    扫描指定文件夹及其子文件夹，收集所有 PNG 文件的 DirEntry。
+    保留 DirEntry 而不只是路径：Windows 上 DirEntry.stat() 直接使用目录枚举时已返回的时间戳，无需再逐个打开文件 stat。
+    使用显式栈 + os.scandir 遍历：DirEntry 的类型信息来自目录读取本身，无需逐个 stat；
+    以绝对路径作为起点后 DirEntry.path 已是绝对路径，无需再 join/abspath。
+    遍历顺序与 os.walk 自顶向下一致 (先当前目录文件，再按顺序进入子目录)，不跟随目录符号链接。
+    """
+    png_entries = []
+    stack = [os.path.abspath(folder_path)]
+    while stack:
+        current_dir = stack.pop()
+        sub_dirs = []
+        try:
+            with os.scandir(current_dir) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        if entry.name == '.bf':
+                            logger.warning("发现并跳过文件夹: {}", entry.path) # 交给 loguru 格式化，级别被过滤时不做字符串拼接
+                        elif not entry.is_symlink():
+                            sub_dirs.append(entry.path)
+                    elif entry.name[-4:].lower() == '.png':
+                        png_entries.append(entry)
+        except OSError as e:
+            # 与 os.walk 默认行为一致：无法读取的目录直接跳过
+            logger.debug("无法读取目录 '{}': {}", current_dir, e)
+            continue
+        # 逆序入栈，使出栈顺序与目录读取顺序一致
+        stack.extend(reversed(sub_dirs))
+    return png_entries
+
+def _read_png_parameters(file_path: str) -> str | None:
+    """
+    直接逐块读取 PNG 文件，取出 'parameters' 文本块，读到 IDAT 即停止 (不触碰像素数据)。
+    解码规则与 Pillow 一致：tEXt/zTXt 按 Latin-1，iTXt 按 UTF-8 严格解码，压缩块用 zlib 解压；同名块以最后一个为准。
+    
+    返回: 元数据字符串 (不存在则为空字符串)；不是 PNG 签名、iTXt 文本不是合法 UTF-8、压缩方法未知或解压结果超过 Pillow 的文本块上限、
+    或读入的 'parameters' 文本块超过 _PNG_TEXT_READ_LIMIT 字节等无法快速判断的情况返回 None，由调用方回退到 Pillow。
+    """
+    with open(file_path, 'rb') as f:
+        if f.read(8) != _PNG_SIGNATURE:
+            return None # 可能是扩展名为 .png 的其他格式，交给 Pillow 识别
+        result = ""
+        text_read = 0
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return result
+            length, chunk_type = _PNG_CHUNK_HEADER.unpack(header)
+            if chunk_type == b'IDAT' or chunk_type == b'IEND':
+                # Pillow 的 img.info 也只包含 IDAT 之前的文本块
+                return result
+            if chunk_type not in _PNG_TEXT_CHUNKS:
+                f.seek(length + 4, os.SEEK_CUR) # 跳过数据和 CRC
+                continue
+            # 先只读关键字前缀：不是 'parameters' 的文本块直接跳过，不把整块读入内存
+            prefix = f.read(min(length, len(_PNG_PARAMETERS_PREFIX)))
+            # 没有 \0 分隔符、整块恰为 "parameters" 时，Pillow 视为值为空的同名块
+            if prefix != _PNG_PARAMETERS_PREFIX and not (length == len(prefix) == 10 and prefix == b'parameters'):
+                f.seek(length - len(prefix) + 4, os.SEEK_CUR) # 跳过剩余数据和 CRC
+                continue
+            text_read += length
+            if text_read > _PNG_TEXT_READ_LIMIT:
+                return None
+            value = f.read(length - len(prefix))
+            f.seek(4, os.SEEK_CUR) # 跳过 CRC
+            if chunk_type == b'tEXt':
+                result = value.decode('latin-1')
+            elif chunk_type == b'iTXt':
+                # iTXt: 压缩标志(1) + 压缩方法(1) + 语言标签\0 + 翻译关键字\0 + 文本
+                if len(value) < 2 or value[0] not in (0, 1):
+                    return None
+                compressed, method = value[0], value[1]
+                _, _, rest = value[2:].partition(b'\x00')
+                _, _, text = rest.partition(b'\x00')
+                if compressed:
+                    text = _inflate_png_text(text) if method == 0 else None
+                    if text is None:
+                        return None
+                try:
+                    result = text.decode('utf-8')
+                except UnicodeDecodeError:
+                    # Pillow 会忽略文本不是合法 UTF-8 的 iTXt 块；这种少见情况交给 Pillow 处理，保证两条路径结果一致
+                    return None
+            else:
+                # zTXt: 压缩方法(1) + zlib 压缩的 Latin-1 文本
+                text = _inflate_png_text(value[1:]) if value[:1] == b'\x00' else None
+                if text is None:
+                    return None
+                result = text.decode('latin-1')
+
+def _inflate_png_text(data: bytes) -> bytes | None:
+    """解压 zTXt/iTXt 的文本数据；解压结果超过 Pillow 的 MAX_TEXT_CHUNK 上限时返回 None (与 Pillow 一样拒绝解压炸弹)。"""
+    decompressor = zlib.decompressobj()
+    text = decompressor.decompress(data, PngImagePlugin.MAX_TEXT_CHUNK)
+    if decompressor.unconsumed_tail:
+        return None
+    return text
 
 def extract_metadata_from_png(file_path: str) -> str:
     """
     从 PNG 文件中提取原始 'parameters' 元数据字符串。
+    优先使用 _read_png_parameters 直接读取文本块，无法处理时回退到 Pillow。
+    公开接口：转换流程在 convert_and_write_metadata 的同一次 Image.open 中读取元数据，本函数保留供外部脚本使用。
     """
+    try:
+        raw_metadata = _read_png_parameters(file_path)
+        if raw_metadata is not None:
+            logger.debug("直接读取 PNG 文本块完成: {}", file_path)
+            return raw_metadata
+    except Exception as e:
+        logger.debug("直接读取 PNG 文本块失败，回退到 Pillow: {}: {}", file_path, e)
     try:
         with Image.open(file_path) as img:
             if "png" in img.format.lower() and "parameters" in img.info:
-                logger.debug(f"成功从 PNG 提取原始元数据: {file_path}")
+                logger.debug("成功从 PNG 提取原始元数据: {}", file_path)
                 return img.info["parameters"]
-            logger.debug(f"文件不是标准 PNG 或缺少 'parameters' 字段: {file_path}")
+            logger.debug("文件不是标准 PNG 或缺少 'parameters' 字段: {}", file_path)
             return ""
     except Exception as e:
         logger.error(f"从 PNG 文件 '{file_path}' 提取元数据失败: {e}")
         return ""
 
+def _ensure_dir(dir_path: str):
+    """
+    创建目录 (已存在不报错)，并在本进程内记住已创建的目录。
+    同一文件夹下的文件会连续落到同一个输出目录，命中缓存时省去 os.makedirs 的 stat/mkdir 系统调用。
+    缓存按进程独立；并发下最坏情况只是多调用一次 exist_ok 的 makedirs，无需加锁。
+    """
+    if dir_path in _CREATED_DIRS:
+        return
+    os.makedirs(dir_path, exist_ok=True)
+    _CREATED_DIRS.add(dir_path)
+
 # 新增辅助函数：计算目标输出子目录
 def _get_output_sub_dir(
     input_path: str, 
@@ -324,21 +587,33 @@ def _get_output_sub_dir(
 ) -> str | None:
     """
     根据输入文件路径和模式，计算目标输出子目录的绝对路径。
+    输出目录只取决于文件所在的文件夹，同一文件夹下的文件共用 _get_output_sub_dir_for_folder 的缓存结果。
     """
-    # 确保路径是绝对路径
-    root_folder_abs = os.path.abspath(root_folder)
-    input_path_abs = os.path.abspath(input_path)
-    
+    return _get_output_sub_dir_for_folder(os.path.dirname(input_path), output_dir_base, root_folder, output_dir_type)
+
+
+@functools.lru_cache(maxsize=1024)
+def _get_output_sub_dir_for_folder(
+    folder: str, 
+    output_dir_base: str, 
+    root_folder: str, 
+    output_dir_type: int
+) -> str | None:
+    """按输入文件所在文件夹计算目标输出子目录 (缓存在各进程内独立存在)。"""
     if output_dir_type == 1:
         # 模式 1: 目标文件夹同级，创建兄弟文件夹，并复刻目录结构
         # -----------------------------------------------------------
+        # 确保路径是绝对路径
+        root_folder_abs = os.path.abspath(root_folder)
+        folder_abs = os.path.abspath(folder)
+        
         parent_folder = os.path.dirname(root_folder)
         sibling_dir_path = os.path.join(parent_folder, output_dir_base)
         
         root_folder_name = os.path.basename(root_folder_abs)
         
         # 获取相对目录 (例如: 子文件夹A/子文件夹B)
-        relative_dir = os.path.relpath(os.path.dirname(input_path_abs), root_folder_abs)
+        relative_dir = os.path.relpath(folder_abs, root_folder_abs)
         
         # 构建新的输出子目录 (新逻辑: D:/PNG转JPG/转换目标/子文件夹A/子文件夹B)
         output_sub_dir = os.path.join(sibling_dir_path, root_folder_name, relative_dir)
@@ -348,7 +623,6 @@ def _get_output_sub_dir(
     elif output_dir_type == 2:
         # 模式 2 (原有模式): 在当前文件所在的子文件夹内创建子目录
         # -----------------------------------------------------------
-        folder = os.path.dirname(input_path)
         output_sub_dir = os.path.join(folder, output_dir_base) 
         return output_sub_dir
         # -----------------------------------------------------------
@@ -356,6 +630,38 @@ def _get_output_sub_dir(
         return None
 
 
+def _pack_exif_value(value: bytes, offset: int) -> Tuple[bytes, bytes]:
+    """返回 (条目中的 4 字节值字段, 需追加到 IFD 之后的数据)。不超过 4 字节的值直接内联。"""
+    if len(value) > 4:
+        return struct.pack(">I", offset), value
+    return value.ljust(4, b"\x00"), b""
+
+
+def _build_exif_bytes(user_comment: bytes, image_description: bytes) -> bytes:
+    """
+    直接拼接只含 ImageDescription (0th IFD) 和 UserComment (Exif IFD) 的 EXIF 字节。
+    结构固定，只有两段变长数据和对应的长度/偏移字段需要逐文件计算，省去 piexif.dump 的字典深拷贝和逐标签遍历。
+    """
+    description = image_description + b"\x00" # ASCII 类型以 NUL 结尾
+    description_field, description_data = _pack_exif_value(
+        description, _TIFF_HEADER_LENGTH + _ZEROTH_IFD_LENGTH
+    )
+    exif_ifd_offset = _TIFF_HEADER_LENGTH + _ZEROTH_IFD_LENGTH + len(description_data)
+    user_comment_field, user_comment_data = _pack_exif_value(
+        user_comment, exif_ifd_offset + _EXIF_IFD_LENGTH
+    )
+    return b"".join((
+        _EXIF_TIFF_HEADER,
+        _IFD_COUNT_AND_ENTRY.pack(2, EXIF_IMAGE_DESCRIPTION_TAG, _TIFF_TYPE_ASCII, len(description)),
+        description_field,
+        _IFD_ENTRY.pack(EXIF_IFD_POINTER_TAG, _TIFF_TYPE_LONG, 1, exif_ifd_offset),
+        b"\x00\x00\x00\x00", # 没有下一个 IFD
+        description_data,
+        _IFD_COUNT_AND_ENTRY.pack(1, EXIF_USER_COMMENT_TAG, _TIFF_TYPE_UNDEFINED, len(user_comment)),
+        user_comment_field,
+        user_comment_data,
+    ))
+
 # 新增：用户保留的纯 UTF-8 兼容性写入方案
 def get_exif_bytes_utf8_compatibility(raw_metadata: str) -> bytes | None:
     """
@@ -383,58 +689,62 @@ def get_exif_bytes_utf8_compatibility(raw_metadata: str) -> bytes | None:
         logger.error(f"[UTF-8 兼容性方案] 生成 EXIF 字节失败: {e}")
         return None
 
+@functools.lru_cache(maxsize=EXIF_BYTES_CACHE_SIZE)
+def _cached_exif_bytes(raw_metadata: str) -> bytes:
+    """
+    按元数据字符串缓存 generate_exif_bytes 的编码结果 (缓存在各工作进程内独立存在)。
+    抛出的异常不会被缓存，失败时仍由 generate_exif_bytes 逐个文件记录日志。
+    """
+    # 1. UserComment 标准编码：与 piexif.helper.UserComment.dump(encoding="unicode") 相同的字节
+    user_comment_bytes = USER_COMMENT_UNICODE_HEADER + raw_metadata.encode('utf_16_be')
+    
+    # 2. ImageDescription 兼容性编码 (UTF-8)
+    # --- 保留的 UTF-8 兼容性/调试写法 (ImageDescription 标签) ---
+    data_utf8 = raw_metadata.encode('utf-8', errors='ignore')
+    
+    # 3. 按固定模板拼接 EXIF (Exif IFD 存放 UserComment，0th IFD 存放 ImageDescription)
+    return _build_exif_bytes(user_comment_bytes, data_utf8)
+
 # 重构：使用 piexif.helper.UserComment.dump 简化标准 UserComment 的生成
 def generate_exif_bytes(raw_metadata: str) -> bytes | None:
     """
-    [优化方案] EXIF 标准 UserComment (UTF-16LE, 使用 piexif.helper) + ImageDescription (UTF-8) 混合写入。
-    - UserComment: 遵循 EXIF 标准 (UNICODE\x00 + UTF-16LE)。
+    [优化方案] EXIF 标准 UserComment (与 piexif.helper 相同的 Unicode 编码) + ImageDescription (UTF-8) 混合写入。
+    - UserComment: 遵循 EXIF 标准 (UNICODE\x00 + UTF-16BE，即 piexif.helper 的 "unicode" 编码)。
     - ImageDescription: 写入纯 UTF-8 字节 (通用兼容)。
+    相同的元数据字符串直接复用 _cached_exif_bytes 中缓存的编码结果。
     """
     try:
-        # 1. UserComment 标准编码：使用 piexif.helper.UserComment.dump 简化操作
-        user_comment_bytes = piexif.helper.UserComment.dump(
-            raw_metadata, 
-            encoding="unicode" # 对应 EXIF 规范的 UTF-16LE 编码和 UNICODE\x00 头部
-        )
-        
-        # 2. ImageDescription 兼容性编码 (UTF-8)
-        # --- 保留的 UTF-8 兼容性/调试写法 (ImageDescription 标签) ---
-        data_utf8 = raw_metadata.encode('utf-8', errors='ignore')
-        
-        # 3. 构造 piexif 字典
-        exif_dict = {
-            # Exif IFD 存放 UserComment (标准 UTF-16LE)
-            "Exif": {
-                EXIF_USER_COMMENT_TAG: user_comment_bytes 
-            },
-            # 0th IFD 存放 ImageDescription (兼容性 UTF-8 编码)
-            "0th": {
-                EXIF_IMAGE_DESCRIPTION_TAG: data_utf8
-            }
-        } 
-        return piexif.dump(exif_dict)
+        return _cached_exif_bytes(raw_metadata)
     except Exception as e:
-        # **改动：针对元数据过长导致的 piexif.dump 失败，记录更详细的警告**
+        # **改动：针对元数据异常导致的 EXIF 生成失败，记录更详细的警告**
         logger.error(f"[标准+兼容混合优化方案] 生成 EXIF 字节失败: {e}. **警告：这通常是由于元数据信息过长 (如 SD 提示词过长) 导致的写入失败**")
         return None
 
 def convert_and_write_metadata(
     png_path: str, 
-    raw_metadata: str, 
+    raw_metadata: str | None, 
     output_format: str, 
     output_dir_base: str, # 保持不变，还是 "png转JPG" 或 "png转WEBP"
     root_folder: str, # 新增：原始根文件夹路径，用于模式1
     output_dir_type: int, # 新增：输出目录模式，1或2
     original_mtime_ts: float, # 新增：原始文件的修改时间戳
-    original_ctime_ts: float  # 新增：原始文件的创建时间戳
-) -> str | None:
+    original_ctime_ts: float, # 新增：原始文件的创建时间戳
+    png_bytes: bytes | None = None # 可选：已预读的 PNG 文件内容，提供时不再从磁盘读取
+) -> Tuple[str | None, str, str]:
     """
     写入过程核心函数：将 PNG 转换为目标格式，并将元数据写入新文件。
     
+    raw_metadata 传入 None 时，在转换所用的同一次 Image.open 中直接读取 'parameters'，
+    避免为提取元数据单独再打开一次 PNG。
+    
+    返回: (输出文件路径或 None, 原始元数据字符串, 实际写入 EXIF 的元数据字符串)。
+    未写入 EXIF (例如元数据过长导致生成失败) 时，第三项为空字符串。
+    
     !!! 安全提示: 本函数仅执行读取、转换和写入操作，不包含任何删除原文件的代码。
     """
+    raw_metadata = raw_metadata or ""
     # 将文件处理状态信息降级到 DEBUG 级别
-    logger.debug(f"--- 正在处理文件: {os.path.basename(png_path)} ---")
+    logger.debug("--- 正在处理文件: {} ---", os.path.basename(png_path))
     
     # 1. 构建新的输出路径和文件夹
     output_sub_dir = _get_output_sub_dir(
@@ -445,24 +755,29 @@ def convert_and_write_metadata(
     )
     if not output_sub_dir:
         logger.error(f"无法获取输出目录，模式 {output_dir_type} 无效。")
-        return None
+        return None, raw_metadata, ""
         
     base_name = os.path.splitext(os.path.basename(png_path))[0]
     new_file_name = f"{base_name}.{output_format}"
     output_path = os.path.join(output_sub_dir, new_file_name)
     
     # 创建目标目录
-    os.makedirs(output_sub_dir, exist_ok=True)
-    logger.debug(f"目标输出路径: {output_path}")
+    _ensure_dir(output_sub_dir)
+    logger.debug("目标输出路径: {}", output_path)
     
     try:
         # 2. 读取图像
-        with Image.open(png_path) as img:
-            logger.debug(f"原始图像模式: {img.mode}")
+        with Image.open(io.BytesIO(png_bytes) if png_bytes is not None else png_path) as img:
+            logger.debug("原始图像模式: {}", img.mode)
+            
+            # 与 extract_metadata_from_png 相同的读取规则，但复用本次打开的图像 (img.info 不需要解码像素)
+            if not raw_metadata and "png" in (img.format or "").lower():
+                raw_metadata = (img.info.get("parameters") or "").strip()
             
             save_kwargs = {}
+            written_metadata = ""
             if raw_metadata:
-                logger.debug(f"原始元数据长度: {len(raw_metadata)}")
+                logger.debug("原始元数据长度: {}", len(raw_metadata))
                 
                 # 3. 准备写入元数据到 EXIF
                 try:
@@ -471,7 +786,8 @@ def convert_and_write_metadata(
 
                     if exif_bytes:
                         save_kwargs['exif'] = exif_bytes
-                        logger.debug(f"EXIF 元数据准备完成 (优化方案: 标准 piexif.helper UserComment + UTF-8 ImageDescription)，字节大小: {len(exif_bytes)}")
+                        written_metadata = raw_metadata
+                        logger.debug("EXIF 元数据准备完成 (优化方案: 标准 piexif.helper UserComment + UTF-8 ImageDescription)，字节大小: {}", len(exif_bytes))
                     # -------------------------------------------------------------------
 
                 except Exception as e:
@@ -479,30 +795,58 @@ def convert_and_write_metadata(
                     logger.error(f"为 '{output_path}' 准备 EXIF 元数据失败: {e}", exc_info=True)
                     logger.warning("将尝试不带 EXIF 写入图像文件。")
             
-            # 4. 保存图像
+            # 4. 编码图像 (先编码到内存，校验后一次性写盘)
+            encoded = io.BytesIO()
             if output_format == 'jpg':
+                # 输入本身是 JPEG 数据时 (例如误用 .png 扩展名)，让 libjpeg 直接解码为 RGB
+                if img.format == 'JPEG':
+                    img.draft('RGB', img.size)
                 # JPG 模式转换：RGBA -> RGB
+                rgb_img = img
                 if img.mode == 'RGBA':
-                    logger.debug("PNG 是 RGBA 模式，转换为 RGB 并填充白色背景。") 
-                    background = Image.new('RGB', img.size, (255, 255, 255))
-                    background.paste(img, mask=img.split()[3]) # 粘贴并使用 Alpha 通道作为蒙版
-                    img = background
+                    alpha = img.getchannel('A') # 只取 A 通道，不拆出其余三个通道
+                    # 很多 SD 生成的 PNG 虽为 RGBA 但完全不透明：此时直接丢弃 Alpha，跳过整图的白底混合
+                    if alpha.getextrema()[0] == 255:
+                        logger.debug("PNG 是 RGBA 模式但完全不透明，直接转换为 RGB。")
+                        rgb_img = img.convert('RGB')
+                    else:
+                        logger.debug("PNG 是 RGBA 模式，转换为 RGB 并填充白色背景。") 
+                        rgb_img = Image.new('RGB', img.size, (255, 255, 255))
+                        rgb_img.paste(img, mask=alpha) # 粘贴并使用 Alpha 通道作为蒙版
+                    alpha.close()
                 elif img.mode != 'RGB':
-                    logger.debug(f"图像模式为 {img.mode}，转换为 RGB。")
-                    img = img.convert('RGB')
+                    logger.debug("图像模式为 {}，转换为 RGB。", img.mode)
+                    rgb_img = img.convert('RGB')
+                
+                # 已得到 RGB 副本时，立即释放源图像的解码缓冲，不必等到 with 块结束 (降低每个工作进程的峰值内存)
+                if rgb_img is not img:
+                    img.close()
                      
-                logger.debug(f"开始保存 JPG 文件，最终模式: {img.mode}")
-                img.save(output_path, 'jpeg', quality=95, **save_kwargs)
+                logger.debug("开始保存 JPG 文件，最终模式: {}", rgb_img.mode)
+                try:
+                    rgb_img.save(encoded, 'jpeg', quality=95, **save_kwargs)
+                finally:
+                    if rgb_img is not img:
+                        rgb_img.close()
                 
             elif output_format == 'webp':
                 # WebP 保存
                 logger.debug("开始保存 WEBP 文件。")
-                img.save(output_path, 'webp', quality=95, **save_kwargs)
+                img.save(encoded, 'webp', quality=95, **save_kwargs)
             else:
                 logger.error(f"不支持的输出格式: {output_format}")
-                return None
+                return None, raw_metadata, ""
+            
+            encoded_data = encoded.getvalue()
+            # 在内存中确认 EXIF 块确实被编码进输出数据 (JPEG 的 APP1 段保留 "Exif\0\0" 头，WebP 的 EXIF 块去掉了这 6 字节)，
+            # 无需写盘后再重新打开解码新文件
+            if written_metadata and save_kwargs['exif'][6:] not in encoded_data:
+                logger.warning(f"EXIF 元数据未出现在编码结果中: {output_path}")
+                written_metadata = ""
             
-            logger.debug(f"文件成功写入: {output_path}")
+            with open(output_path, 'wb') as f:
+                f.write(encoded_data)
+            logger.debug("文件成功写入: {}", output_path)
             
             # --- 5. 写入原始时间戳 ---
             mtime_success = False
@@ -510,14 +854,21 @@ def convert_and_write_metadata(
             # 增加误差范围为 2 秒，以应对文件系统、操作系统和 Python 解释器在时间戳精度上的差异。
             TIME_CONSISTENCY_TOLERANCE = 2
             
-            if original_mtime_ts > 0:
-                # 优先设置 mtime (跨平台最可靠)，只设置 mtime，不设置 ctime
-                mtime_success = file_timestamp_tools.modify_file_timestamps(output_path, original_mtime_ts, set_mtime=True, set_ctime=False)
-                logger.debug(f"Mtime 写入结果: {'成功' if mtime_success else '失败'}")
+            set_mtime = original_mtime_ts > 0
+            set_ctime = original_ctime_ts > 0
+            if set_mtime or set_ctime:
+                # 一次调用同时写入 mtime 和 ctime (Windows 上只打开一次文件句柄；ctime 仅 Windows 有效)；
+                # 两者各自按是否有效决定是否写入。只写 ctime 时 new_timestamp 传 ctime，仅用于有效性检查。
+                timestamps_written = file_timestamp_tools.modify_file_timestamps(
+                    output_path, original_mtime_ts if set_mtime else original_ctime_ts, 
+                    set_mtime=set_mtime, set_ctime=set_ctime, 
+                    ctime_timestamp=original_ctime_ts
+                )
+                if set_mtime:
+                    mtime_success = timestamps_written
+                    logger.debug("Mtime 写入结果: {}", '成功' if mtime_success else '失败')
                 
             if original_ctime_ts > 0:
-                # 尝试设置 ctime (Windows only)，只设置 ctime，不设置 mtime
-                ctime_success = file_timestamp_tools.modify_file_timestamps(output_path, original_ctime_ts, set_mtime=False, set_ctime=True)
                 # 重新检查 ctime 是否匹配（仅在 Windows 上有意义）
                 current_ctime = os.stat(output_path).st_ctime
                 # 检查 ctime 是否接近原始 ctime
@@ -525,33 +876,34 @@ def convert_and_write_metadata(
                     ctime_success = True
                 else:
                     ctime_success = False
-                logger.debug(f"Ctime 写入结果: {'成功' if ctime_success else '失败'}")
+                logger.debug("Ctime 写入结果: {}", '成功' if ctime_success else '失败')
 
             # ---------------------------
             
-            return output_path
+            return output_path, raw_metadata, written_metadata
             
     except Exception as e:
         # 捕获文件读取或最终保存过程中的错误
         # **改动：捕获最终保存失败的错误**
         logger.error(f"转换或保存文件 '{png_path}' 到 '{output_path}' 失败: {e}", exc_info=True)
-        return None
+        return None, raw_metadata, ""
 
 def process_conversion_task(
     png_path: str, 
-    raw_metadata: str, # 新增：预提取的原始元数据
+    raw_metadata: str | None, # 预提取的原始元数据；None 表示由转换步骤在同一次打开中读取
     output_format: str, 
     output_dir_base: str, 
     root_folder: str, # 新增：根文件夹
     output_dir_type: int, # 新增：输出目录模式
     original_mtime_ts: float, # 新增：原始 mtime
-    original_ctime_ts: float  # 新增：原始 ctime
+    original_ctime_ts: float, # 新增：原始 ctime
+    png_bytes: bytes | None = None # 可选：已预读的 PNG 文件内容
 ) -> Dict[str, Any]:
     """
-    [多线程工作单元] 处理单个 PNG 文件的提取、转换、写入和校验。
+    [工作单元] 处理单个 PNG 文件的提取、转换、写入和校验。由 process_conversion_batch 在工作进程中调用。
     """
-    # 2. 执行转换和写入元数据
-    new_file_path = convert_and_write_metadata( # 调用核心转换函数
+    # 2. 执行转换和写入元数据 (元数据读取与转换共用一次 Image.open)
+    new_file_path, raw_metadata, written_metadata = convert_and_write_metadata( # 调用核心转换函数
         png_path, 
         raw_metadata, 
         output_format, 
@@ -559,23 +911,23 @@ def process_conversion_task(
         root_folder, # 传递根文件夹
         output_dir_type, # 传递输出目录模式
         original_mtime_ts, # 传递原始 mtime
-        original_ctime_ts  # 传递原始 ctime
+        original_ctime_ts, # 传递原始 ctime
+        png_bytes
     )
     
     # 3. 结果收集逻辑
     if new_file_path: # 检查文件是否成功生成
         # 成功逻辑
         
-        # 扫描新文件的元数据进行对比
-        new_file_scan_result = process_single_image(new_file_path) # 再次扫描新生成的文件进行元数据提取和结构化
-        
-        new_file_info_string = ( # 获取新文件的元数据字符串
-            new_file_scan_result.get("去掉换行符的生成信息", "") 
-            if new_file_scan_result else "未扫描到信息"
-        )
-        
         # 简化原始信息进行对比
-        raw_png_info_no_newlines = raw_metadata.replace('\n', ' ').replace('\r', ' ').strip() # 清理原始元数据字符串
+        raw_png_info_no_newlines = _flatten_newlines(raw_metadata) # 清理原始元数据字符串
+        
+        # 新文件的 EXIF 正是由 written_metadata 生成的，直接用它对比，无需重新打开并解析新文件。
+        # 写入的就是原始元数据对象本身时，清理结果必然相同，直接复用 (下方的 == 因对象相同而 O(1) 返回)
+        if written_metadata is raw_metadata:
+            new_file_info_string = raw_png_info_no_newlines
+        else:
+            new_file_info_string = _flatten_newlines(written_metadata)
         
         # 对比结果
         is_consistent = "否" # 默认标记为不一致
@@ -586,15 +938,15 @@ def process_conversion_task(
         # --- 4. 时间戳验证逻辑 ---
         mtime_consistent = "否"
         ctime_consistent = "否"
-        original_mtime_dt = datetime.fromtimestamp(original_mtime_ts).strftime("%Y-%m-%d %H:%M:%S")
-        original_ctime_dt = datetime.fromtimestamp(original_ctime_ts).strftime("%Y-%m-%d %H:%M:%S")
+        original_mtime_dt = _format_local_datetime(original_mtime_ts)
+        original_ctime_dt = _format_local_datetime(original_ctime_ts)
         
         try:
             stat_info_final = os.stat(new_file_path)
             final_mtime_ts = stat_info_final.st_mtime
             final_ctime_ts = stat_info_final.st_ctime
-            final_mtime_dt = datetime.fromtimestamp(final_mtime_ts).strftime("%Y-%m-%d %H:%M:%S")
-            final_ctime_dt = datetime.fromtimestamp(final_ctime_ts).strftime("%Y-%m-%d %H:%M:%S")
+            final_mtime_dt = _format_local_datetime(final_mtime_ts)
+            final_ctime_dt = _format_local_datetime(final_ctime_ts)
 
             # 校验 mtime (允许小于1秒的误差)
             if abs(final_mtime_ts - original_mtime_ts) < 1:
@@ -628,7 +980,7 @@ def process_conversion_task(
         }
     else:
         # 失败逻辑：转换或保存失败 (包括元数据过长导致的保存失败)
-        raw_png_info_no_newlines = raw_metadata.replace('\n', ' ').replace('\r', ' ').strip()
+        raw_png_info_no_newlines = _flatten_newlines(raw_metadata)
         
         # 失败处理：复制原始文件到目标目录
         output_sub_dir = _get_output_sub_dir(
@@ -640,7 +992,7 @@ def process_conversion_task(
         copied_path = "原始文件复制失败"
         if output_sub_dir:
             try:
-                os.makedirs(output_sub_dir, exist_ok=True)
+                _ensure_dir(output_sub_dir)
                 # 复制原始 PNG 文件
                 copied_filename = os.path.basename(png_path)
                 copied_path_full = os.path.join(output_sub_dir, copied_filename)
@@ -656,8 +1008,8 @@ def process_conversion_task(
         
         # 提取原始时间，以便在失败报告中记录
         # ** FIX: 移除冗余且错误的 tasks_data 查找，直接使用函数参数 original_mtime_ts 和 original_ctime_ts **
-        original_mtime_dt = datetime.fromtimestamp(original_mtime_ts).strftime("%Y-%m-%d %H:%M:%S")
-        original_ctime_dt = datetime.fromtimestamp(original_ctime_ts).strftime("%Y-%m-%d %H:%M:%S")
+        original_mtime_dt = _format_local_datetime(original_mtime_ts)
+        original_ctime_dt = _format_local_datetime(original_ctime_ts)
         
         return { # 返回失败任务的结果字典
             "原文件的绝对路径": png_path,
@@ -676,9 +1028,156 @@ def process_conversion_task(
         }
 
 
+def _read_file_bytes(file_path: str) -> bytes | None:
+    """读取整个文件内容；失败时返回 None，由后续 Image.open(路径) 按原逻辑报告错误。"""
+    try:
+        with open(file_path, 'rb') as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _build_conversion_task(entry: os.DirEntry) -> Dict[str, Any]:
+    """
+    构造提交给 process_conversion_batch 的任务字典，并预提取原始时间戳 (失败时记为 0)。
+    时间戳取自 DirEntry.stat()：Windows 上由目录枚举结果直接给出 (无需打开文件，也就不会触发杀毒软件的文件扫描)，
+    其他平台等同于一次 os.stat。
+    """
+    png_path = entry.path
+    original_mtime_ts = 0.0
+    original_ctime_ts = 0.0
+    try:
+        stat_info = entry.stat()
+        original_mtime_ts = stat_info.st_mtime
+        original_ctime_ts = stat_info.st_ctime
+    except Exception as e:
+        logger.warning(f"获取文件时间戳失败 '{png_path}': {e}")
+    return {
+        "png_path": png_path,
+        "raw_metadata": None, # 由 convert_and_write_metadata 在转换时读取
+        "original_mtime_ts": original_mtime_ts, # 新增：原始 mtime
+        "original_ctime_ts": original_ctime_ts  # 新增：原始 ctime
+    }
+
+
+def _build_task_exception_result(task: Dict[str, Any], output_format: str) -> Dict[str, Any]:
+    """为异常终止的任务构造失败记录 (只能依赖预提取的原始时间戳)。"""
+    original_mtime_dt = _format_local_datetime(task.get('original_mtime_ts', 0.0))
+    original_ctime_dt = _format_local_datetime(task.get('original_ctime_ts', 0.0))
+    return {
+        "原文件的绝对路径": task['png_path'],
+        "原文件的pnginfo信息": "任务异常",
+        f"生成的{output_format.upper()}文件的绝对路径": "转换失败 (任务异常)",
+        f"生成的{output_format.upper()}文件的pnginfo信息": "转换失败 (任务异常)",
+        "原文件和生成文件的pnginfo信息是否一致": "否 (任务异常)",
+        "原文件修改时间(mtime)": original_mtime_dt,
+        "新文件修改时间(mtime)": "任务异常",
+        "Mtime移植是否成功": "否 (任务异常)",
+        "原文件创建时间(ctime)": original_ctime_dt,
+        "新文件创建时间(ctime)": "任务异常",
+        "Ctime移植是否成功(Win Only)": "否 (任务异常)",
+        "任务执行状态": "失败 (异常)", # 标记为失败
+        "是否需要触发全局警告": True # 任务异常需要触发警告
+    }
+
+
+def process_conversion_batch(
+    tasks: List[Dict[str, Any]],
+    output_format: str,
+    output_dir_base: str,
+    root_folder: str,
+    output_dir_type: int
+) -> List[Dict[str, Any]]:
+    """
+    [多进程工作单元] 依次处理一批 PNG 文件。
+    批内用一个后台线程提前读取后续 PREFETCH_DEPTH 个文件的字节：文件读取期间释放 GIL，
+    当前文件的解码/编码 (libpng/libjpeg 同样释放 GIL) 与下一个文件的磁盘读取得以重叠。
+    单个文件抛出的异常在这里转换为失败记录，不影响同批的其他文件。
+    注意：必须保持为模块顶层函数，且参数/返回值均可被 pickle，才能提交到进程池。
+    """
+    results = []
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as reader:
+        pending = deque(
+            reader.submit(_read_file_bytes, task['png_path']) for task in tasks[:PREFETCH_DEPTH]
+        )
+        for index, task in enumerate(tasks):
+            png_bytes = pending.popleft().result()
+            next_index = index + PREFETCH_DEPTH
+            if next_index < len(tasks):
+                pending.append(reader.submit(_read_file_bytes, tasks[next_index]['png_path']))
+            try:
+                results.append(process_conversion_task(
+                    task['png_path'],
+                    task['raw_metadata'],
+                    output_format,
+                    output_dir_base,
+                    root_folder,
+                    output_dir_type,
+                    task['original_mtime_ts'],
+                    task['original_ctime_ts'],
+                    png_bytes
+                ))
+            except Exception as exc:
+                logger.error(f"文件 '{task['png_path']}' 转换任务异常终止: {exc}")
+                results.append(_build_task_exception_result(task, output_format))
+    return results
+
+
+def _report_headers(output_format: str) -> List[str]:
+    """Excel 报告的表头，与 process_conversion_task / _build_task_exception_result 返回字典的键一致。"""
+    return [
+        "原文件的绝对路径",
+        "原文件的pnginfo信息",
+        f"生成的{output_format.upper()}文件的绝对路径",
+        f"生成的{output_format.upper()}文件的pnginfo信息",
+        "原文件和生成文件的pnginfo信息是否一致",
+        "原文件修改时间(mtime)",
+        "新文件修改时间(mtime)",
+        "Mtime移植是否成功",
+        "原文件创建时间(ctime)",
+        "新文件创建时间(ctime)",
+        "Ctime移植是否成功(Win Only)",
+        "任务执行状态",
+        "是否需要触发全局警告"
+    ]
+
+
+def _open_report_sheet(headers: List[str]):
+    """
+    以 openpyxl write-only 模式创建 Excel 报告并写入表头，返回 (工作簿, 工作表)。
+    write-only 工作表把追加的行直接序列化到临时文件，不在内存中保留单元格对象，
+    结果可以边完成边写入，无需先把全部结果收集到列表中。
+    """
+    from openpyxl import Workbook # 延迟导入 (见模块顶部说明)
+    
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet("Sheet1")
+    ws.append(headers)
+    return wb, ws
+
+
+def _append_report_row(ws, result: Dict[str, Any], headers: List[str]):
+    """
+    把一条任务结果写入报告。写入发生在转换循环中，任何异常都不能向外抛出，否则会中断后续批次的提交。
+    write-only 工作表在写出 XML 时才逐个检查单元格值，一旦某个值被拒绝，整张表的写入流即告中断，
+    因此先在这里把值整理为 openpyxl 一定接受的形式：字符串删除控制字符 (原始元数据可能含有 \x1b 等字符)，
+    其他非基本类型转为字符串。仍然失败时只记录日志，报告在最后保存时报错，转换照常进行。
+    """
+    row = []
+    for key in headers:
+        value = result.get(key)
+        if value is not None and not isinstance(value, (bool, int, float)):
+            value = _strip_illegal_chars(value if isinstance(value, str) else str(value))
+        row.append(value)
+    try:
+        ws.append(row)
+    except Exception as e:
+        logger.error("写入报告行失败 '{}': {}", result.get("原文件的绝对路径"), e)
+
+
 def main_conversion_process(root_folder: str, choice: int, choice_dir: int):
     """
-    主处理流程，包括扫描、转换、生成报告。使用多线程并发处理文件。
+    主处理流程，包括扫描、转换、生成报告。使用多进程并发处理文件。
     
     参数:
     root_folder (str): 根文件夹路径。
@@ -694,8 +1193,8 @@ def main_conversion_process(root_folder: str, choice: int, choice_dir: int):
     output_dir_base = f"PNG转{output_format.upper()}" # 定义输出子目录名称 (使用大写，与用户描述一致)
     report_file = f"png_conversion_report_{output_format}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx" # 定义报告文件名称
     
-    png_files = get_png_files(root_folder) # 扫描文件夹，获取所有 PNG 文件路径
-    total_files = len(png_files) # 任务总数
+    png_entries = _scan_png_entries(root_folder) # 扫描文件夹，获取所有 PNG 文件 (DirEntry，提交任务时复用其 stat 信息)
+    total_files = len(png_entries) # 任务总数
     
     if not total_files: # 如果没有找到文件
         logger.info(f"在 '{root_folder}' 中未找到任何 PNG 文件。") # 打印日志
@@ -704,159 +1203,138 @@ def main_conversion_process(root_folder: str, choice: int, choice_dir: int):
     logger.info(f"在 '{root_folder}' 中发现 {total_files} 个 PNG 文件。将转换为 {output_format.upper()}。") # 打印任务信息
     
     # 修复 Pylance 警告：由于此处只读取 MAX_WORKERS，无需使用 global 关键字。
-    logger.info(f"本次任务将使用 {MAX_WORKERS} 个线程进行并发处理 (基于当前计算机的 CPU 核心数)。")
-
-    # --- 任务准备：预提取元数据和时间戳 ---
-    tasks_data = []
-    for png_path in png_files:
-        # 预提取元数据
-        raw_metadata = extract_metadata_from_png(png_path)
-        if raw_metadata:
-            raw_metadata = raw_metadata.strip()
-            
-        # 预提取时间戳
-        original_mtime_ts = 0.0
-        original_ctime_ts = 0.0
-        try:
-            stat_info = os.stat(png_path)
-            original_mtime_ts = stat_info.st_mtime
-            original_ctime_ts = stat_info.st_ctime
-        except Exception as e:
-            logger.warning(f"获取文件时间戳失败 '{png_path}': {e}")
-            
-        tasks_data.append({
-            "png_path": png_path,
-            "raw_metadata": raw_metadata,
-            "original_mtime_ts": original_mtime_ts, # 新增：原始 mtime
-            "original_ctime_ts": original_ctime_ts  # 新增：原始 ctime
-        })
-    logger.info(f"已预提取 {len(tasks_data)} 个文件的原始元数据和时间戳。")
+    logger.info(f"本次任务将使用 {MAX_WORKERS} 个进程进行并发处理 (基于当前计算机的 CPU 核心数)。")
+    # 官方 Pillow 预编译包自带 libjpeg-turbo (SIMD 加速的 JPEG 编解码)；自行编译的 Pillow 可能链接的是原版 libjpeg，编码速度慢数倍
+    if output_format == 'jpg' and not features.check_feature("libjpeg_turbo"):
+        logger.warning("当前 Pillow 未链接 libjpeg-turbo，JPG 编码会明显变慢。建议安装官方 Pillow 预编译包 (pip install --force-reinstall pillow) 或 pillow-simd。")
+
+    # --- 任务准备 ---
+    # 原始时间戳在提交每一批时才读取 (_build_conversion_task)，不再在启动进程池前逐个 stat 全部文件；
+    # 元数据也不在此处单独打开 PNG 读取，而是由工作进程在转换时的同一次 Image.open 中读取。
     # --------------------------------------------------------
     
-    conversion_results = [] # 初始化结果列表
-    futures_to_path = {} # 初始化字典，用于存储 Future 对象和对应的文件路径
+    headers = _report_headers(output_format)
+    report_wb, report_ws = _open_report_sheet(headers) # 结果边完成边写入报告，不在内存中累积
     success_count = 0 # 初始化成功计数器
     failure_count = 0 # 初始化失败计数器
+    inconsistent_count = 0 # 元数据一致性校验失败计数
+    inconsistent_mtime_count = 0 # Mtime 移植失败计数
+    needs_everything_warning = False # 是否有任务要求触发全局警告
     
-    logger.info("--- 开始多线程文件转换处理 ---") # 打印多线程启动日志
+    logger.info("--- 开始多进程文件转换处理 ---") # 打印多进程启动日志
     
-    # 2. 转换和记录 (使用多线程)
-    # 使用 ThreadPoolExecutor 实现多线程并发，适合 I/O 密集型任务（文件读写）
-    with concurrent.futures.ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor: # 实例化线程池执行器，并设置最大工作线程数
+    # 2. 转换和记录 (使用多进程)
+    # PNG 解码、RGB 合成和 JPG/WebP 编码都是 CPU 密集型操作，Pillow 只在部分环节释放 GIL，
+    # 线程池无法吃满多核；改用 ProcessPoolExecutor，每个进程独立解码/编码，可随核心数近似线性扩展。
+    # 任务按 CONVERSION_BATCH_SIZE 个文件一批提交，批内由 process_conversion_batch 预读后续文件。
+    # 同时在途的批次不超过 MAX_IN_FLIGHT_BATCHES：每取回一批结果再补交下一批，
+    # 待处理的 Future 和未写入报告的结果都保持在固定数量以内，与文件总数无关。
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=MAX_WORKERS, # 设置最大工作进程数
+        initializer=_init_worker_logging, # 工作进程的日志经主进程的 enqueue 队列写出
+        initargs=(logger,)
+    ) as executor: # 实例化进程池执行器
         
-        # 遍历所有任务数据，并将任务提交给线程池
-        for task in tasks_data: # 遍历待处理的任务列表
-            png_path = task['png_path']
-            raw_metadata = task['raw_metadata']
-            original_mtime_ts = task['original_mtime_ts'] # 从任务数据中获取 mtime
-            original_ctime_ts = task['original_ctime_ts'] # 从任务数据中获取 ctime
-            
-            # 提交任务到线程池，执行 process_conversion_task 函数
+        batch_starts = iter(range(0, total_files, CONVERSION_BATCH_SIZE))
+        futures_to_batch = {} # 在途的 Future 对象 -> 对应的任务批次
+        
+        def submit_next_batch():
+            """提交下一批任务；没有剩余批次时什么也不做。"""
+            start = next(batch_starts, None)
+            if start is None:
+                return
+            batch = [_build_conversion_task(entry) for entry in png_entries[start:start + CONVERSION_BATCH_SIZE]]
             future = executor.submit(
-                process_conversion_task, 
-                png_path, 
-                raw_metadata, # 传递预提取的元数据
-                output_format, 
+                process_conversion_batch,
+                batch,
+                output_format,
                 output_dir_base,
                 root_folder, # 传递根文件夹
-                choice_dir, # 传递输出目录模式
-                original_mtime_ts, # 传递原始 mtime
-                original_ctime_ts  # 传递原始 ctime
-            ) # 提交 worker 函数到线程池，传递必要的参数
-            # 存储 Future 对象和对应的原始文件路径
-            futures_to_path[future] = png_path # 将返回的 Future 对象作为键，文件路径作为值存入字典
+                choice_dir # 传递输出目录模式
+            ) # 提交 worker 函数到进程池，传递必要的参数
+            futures_to_batch[future] = batch
+        
+        for _ in range(MAX_IN_FLIGHT_BATCHES):
+            submit_next_batch()
         
-        # 使用 concurrent.futures.as_completed 迭代已完成的 Future
-        # 并结合 tqdm 来显示进度条
+        # 等待任意一批完成，按文件数推进 tqdm 进度条
+        from tqdm import tqdm # 延迟导入 (见模块顶部说明)
         progress_bar = tqdm( # 创建进度条
-            concurrent.futures.as_completed(futures_to_path), # 迭代已完成的任务 Future
             total=total_files, # 设置进度条的总步数为文件总数
-            desc=f"转换到 {output_format.upper()} 进度" # 进度条的描述文本
+            desc=f"转换到 {output_format.upper()} 进度", # 进度条的描述文本
+            mininterval=1.0, # 最多每秒重绘一次
+            disable=None # 输出被重定向 (非终端) 时不显示进度条，避免把每次刷新都写进日志
         )
         
-        for future in progress_bar: # 遍历每一个已完成的 Future
-            png_path = futures_to_path[future] # 从字典中获取该 Future 对应的文件路径
-            try:
-                result = future.result() # 获取线程执行的结果（即 process_conversion_task 的返回值）
-                conversion_results.append(result) # 将结果字典添加到总列表中
-                
-                # 更新计数器
-                if result.get('任务执行状态') in ["成功", "成功 (部分)"]: # 根据结果字典中的 '任务执行状态' 键判断任务是否成功
-                    success_count += 1 # 成功任务计数加一
-                else:
-                    failure_count += 1 # 失败任务计数加一
-                
-            except Exception as exc: # 捕获任务执行过程中发生的任何异常
-                logger.error(f"文件 '{png_path}' 转换任务异常终止: {exc}") # 记录异常错误日志
-                failure_count += 1 # 任务异常，失败任务计数加一
-                # 添加一个失败记录到结果列表
-                
-                # 任务异常失败逻辑
-                # 获取原始时间戳（如果任务异常，这里只能依赖预提取的数据）
-                task_data = next(task for task in tasks_data if task['png_path'] == png_path)
-                original_mtime_ts = task_data.get('original_mtime_ts', 0.0)
-                original_ctime_ts = task_data.get('original_ctime_ts', 0.0)
-                original_mtime_dt = datetime.fromtimestamp(original_mtime_ts).strftime("%Y-%m-%d %H:%M:%S")
-                original_ctime_dt = datetime.fromtimestamp(original_ctime_ts).strftime("%Y-%m-%d %H:%M:%S")
+        try:
+            while futures_to_batch:
+                done, _ = concurrent.futures.wait(futures_to_batch, return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    batch = futures_to_batch.pop(future) # 取出该 Future 对应的任务批次
+                    submit_next_batch() # 先补交下一批，让进程池在写报告期间保持忙碌
+                    try:
+                        batch_results = future.result() # 获取进程执行的结果（即 process_conversion_batch 的返回值）
+                    except Exception as exc: # 整批失败 (例如工作进程崩溃)，批内每个文件都记为任务异常
+                        logger.error(f"批次任务异常终止 ({len(batch)} 个文件，首个文件 '{batch[0]['png_path']}'): {exc}")
+                        batch_results = [_build_task_exception_result(task, output_format) for task in batch]
                 
-                conversion_results.append({ # 添加失败任务的结果字典
-                    "原文件的绝对路径": png_path,
-                    "原文件的pnginfo信息": "任务异常",
-                    f"生成的{output_format.upper()}文件的绝对路径": "转换失败 (任务异常)",
-                    f"生成的{output_format.upper()}文件的pnginfo信息": "转换失败 (任务异常)",
-                    "原文件和生成文件的pnginfo信息是否一致": "否 (任务异常)",
-                    "原文件修改时间(mtime)": original_mtime_dt,
-                    "新文件修改时间(mtime)": "任务异常",
-                    "Mtime移植是否成功": "否 (任务异常)",
-                    "原文件创建时间(ctime)": original_ctime_dt,
-                    "新文件创建时间(ctime)": "任务异常",
-                    "Ctime移植是否成功(Win Only)": "否 (任务异常)",
-                    "任务执行状态": "失败 (异常)", # 标记为失败
-                    "是否需要触发全局警告": True # 任务异常需要触发警告
-                })
+                    for result in batch_results:
+                        _append_report_row(report_ws, result, headers) # 立即写入报告 (写入失败不影响转换)
+                        # 更新计数器
+                        if result.get('任务执行状态') in ["成功", "成功 (部分)"]: # 根据结果字典中的 '任务执行状态' 键判断任务是否成功
+                            success_count += 1 # 成功任务计数加一
+                        else:
+                            failure_count += 1 # 失败任务计数加一
+                        if '否' in result.get('原文件和生成文件的pnginfo信息是否一致', ''):
+                            inconsistent_count += 1
+                        if result.get('Mtime移植是否成功') == '否':
+                            inconsistent_mtime_count += 1 # 新增：Mtime不一致校验
+                        if result.get("是否需要触发全局警告"): # 检查是否有任务要求触发警告
+                            needs_everything_warning = True
+                    progress_bar.update(len(batch))
+        finally:
+            progress_bar.close()
 
     # 3. 结果总结和 Excel 报告生成
     logger.info("\n--- 转换总结 ---")
     logger.info(f"总数量: {total_files}, 成功: {success_count}, 失败: {failure_count}")
 
     # **新增: Everything 警告逻辑**
-    needs_everything_warning = any(
-        result.get("是否需要触发全局警告") # 检查是否有任务要求触发警告
-        for result in conversion_results
-    )
     if needs_everything_warning:
         logger.warning("-" * 50)
         logger.warning("【🔍 检查警报 🔍】")
         logger.warning("由于部分文件转换失败或信息写入不一致，建议使用 Everything 软件进行更多检查，以便快速定位未处理的原始 PNG 文件。")
         logger.warning("-" * 50)
 
-    if conversion_results:
-        try:
-            df = pd.DataFrame(conversion_results)
-            # 新增：元数据一致性校验统计
-            inconsistent_count = (df['原文件和生成文件的pnginfo信息是否一致'].str.contains('否')).sum()
-            inconsistent_mtime_count = (df['Mtime移植是否成功'] == '否').sum() # 新增：Mtime不一致校验
-            logger.info(f"元数据不一致 (校验失败) 数量: {inconsistent_count} (请查看 Excel 报告中 '否 (转换失败)' 和 '否 (任务异常)' 的记录)")
-            logger.info(f"Mtime 移植失败数量: {inconsistent_mtime_count} (请检查报告中的 'Mtime移植是否成功' 列)") # Mtime移植失败日志
-
-            # 根据用户需求，日志和 Excel 报告都要自动运行打开
-            report_abs_path = os.path.abspath(report_file)
-            df.to_excel(report_file, index=False, engine='openpyxl')
-            
-            logger.info(f"报告已成功生成: {report_abs_path}")
-            # 4. 自动运行打开 Excel 报告
-            os.startfile(report_abs_path) 
-        except Exception as e:
-            logger.error(f"生成 Excel 报告失败: {e}", exc_info=True)
+    try:
+        # 新增：元数据一致性校验统计
+        logger.info(f"元数据不一致 (校验失败) 数量: {inconsistent_count} (请查看 Excel 报告中 '否 (转换失败)' 和 '否 (任务异常)' 的记录)")
+        logger.info(f"Mtime 移植失败数量: {inconsistent_mtime_count} (请检查报告中的 'Mtime移植是否成功' 列)") # Mtime移植失败日志
 
+        # 根据用户需求，日志和 Excel 报告都要自动运行打开
+        report_abs_path = os.path.abspath(report_file)
+        report_wb.save(report_file)
+        
+        logger.info(f"报告已成功生成: {report_abs_path}")
+        # 4. 自动运行打开 Excel 报告
+        os.startfile(report_abs_path) 
+    except Exception as e:
+        logger.error(f"生成 Excel 报告失败: {e}", exc_info=True)
 
 if __name__ == "__main__":
+    # 进程池在 Windows 上以 spawn 方式启动子进程；PyInstaller 打包的 exe 必须先调用 freeze_support，
+    # 否则子进程会重新执行主程序入口。
+    multiprocessing.freeze_support()
+    _configure_logging()
     
     # ** 核心安全警告：本工具仅执行读取和写入操作，不包含任何删除原始文件的功能。**
     logger.info("--- PNG 图片批量转换和元数据校验工具启动 ---")
     # 提示当前控制台级别已设置为 INFO
     logger.info("注意: 控制台日志级别已设置为 INFO，将只输出重要流程信息。详细 DEBUG/文件处理信息请通过修改代码查看。")
     
+    # 控制台 sink 为 enqueue 模式，由后台线程输出；等待已记录的日志输出完毕，再显示输入提示
+    logger.complete()
+    
     # 1. 收集输入 - 文件夹路径
     while True:
         folder_path_input = input("请输入要扫描的文件夹绝对路径: ").strip()
@@ -898,7 +1376,7 @@ if __name__ == "__main__":
         # 确保使用全局 MAX_WORKERS
         logger.warning("-" * 50)
         logger.warning("【⚠️ 性能严重警告 ⚠️】")
-        logger.warning(f"当前程序使用 {MAX_WORKERS} 线程进行高强度文件 I/O，可能导致 CPU 占用率接近 100%。")
+        logger.warning(f"当前程序使用 {MAX_WORKERS} 个进程进行高强度图片编码和文件 I/O，可能导致 CPU 占用率接近 100%。")
         logger.warning("如果您运行在 Windows 系统，微软实时防护进程 MsMpEng.exe ('Antimalware Service Executable') 可能会扫描大量文件 I/O，极大地拖慢转换速度、抢占 CPU 资源，甚至造成系统卡死。")
         logger.warning("强烈建议您在运行本程序前：")
         logger.warning("  1. 暂时关闭 Windows Defender 实时保护。")
@@ -909,6 +1387,7 @@ if __name__ == "__main__":
     main_conversion_process(root_folder, choice, choice_dir)
     
     logger.info("--- 任务完成 ---")
+    logger.complete()
     
     # **程序结束暂停，等待用户回车关闭窗口**
     try:
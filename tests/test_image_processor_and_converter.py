@@ -0,0 +1,106 @@
+"""
+image_processor_and_converter 的公开扫描接口测试 (process_single_image / get_png_files / extract_metadata_from_png)。
+转换主流程不再调用这些函数，这里保证它们作为公开接口继续可用。
+
+运行 (在仓库根目录): python -m unittest discover tests
+"""
+import os
+import shutil
+import tempfile
+import unittest
+
+from PIL import Image, PngImagePlugin
+
+import image_processor_and_converter as converter
+
+
+# 以第一行停用词组结尾的正向提示词：核心词提取后只剩 "1girl,"
+_PROMPT_ENDING_IN_STOP_WORDS = (
+    "1girl, newest, 2025, toosaka_asagi, novel_illustration, torino_aqua, izumi_tsubasu, oyuwari, pottsness, "
+    "yunsang, hito_komoru, akeyama_kitsune, fi-san, rourou_\\(been\\), gweda, fuzichoco, shanguier, anmi, missile228,"
+)
+_PARAMETERS = (
+    f"{_PROMPT_ENDING_IN_STOP_WORDS}\n"
+    "Negative prompt: lowres, bad anatomy\n"
+    "Steps: 28, Sampler: Euler a, CFG scale: 5, Seed: 1, Size: 64x64, Model: testModel_v1, Version: v1.10.1"
+)
+
+
+def _save_png(path: str, parameters: str | None = None, itxt: bool = False):
+    info = PngImagePlugin.PngInfo()
+    if itxt:
+        info.add_itxt("parameters", parameters) # 非 ASCII 文本用 iTXt (UTF-8)
+    elif parameters is not None:
+        info.add_text("parameters", parameters)
+    Image.new("RGBA", (64, 64), (200, 100, 50, 255)).save(path, pnginfo=info)
+
+
+class PublicScanApiTest(unittest.TestCase):
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        os.makedirs(os.path.join(self.root, "sub", "deeper"))
+        os.makedirs(os.path.join(self.root, ".bf"))
+        self.top_png = os.path.join(self.root, "top.png")
+        self.sub_png = os.path.join(self.root, "sub", "a.PNG")
+        self.deep_png = os.path.join(self.root, "sub", "deeper", "b.png")
+        _save_png(self.top_png, _PARAMETERS)
+        _save_png(self.sub_png, "masterpiece, 中文\nSteps: 20, Sampler: Euler a", itxt=True)
+        _save_png(self.deep_png)
+        _save_png(os.path.join(self.root, ".bf", "skipped.png"), _PARAMETERS)
+        with open(os.path.join(self.root, "notes.txt"), "w", encoding="utf-8") as f:
+            f.write("not an image")
+
+    def tearDown(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def test_get_png_files(self):
+        found = converter.get_png_files(self.root)
+        self.assertEqual(sorted(found), sorted([self.top_png, self.sub_png, self.deep_png]))
+        self.assertTrue(all(os.path.isabs(path) for path in found))
+
+    def test_extract_metadata_from_png(self):
+        self.assertEqual(converter.extract_metadata_from_png(self.top_png), _PARAMETERS)
+        self.assertEqual(converter.extract_metadata_from_png(self.sub_png), "masterpiece, 中文\nSteps: 20, Sampler: Euler a")
+        self.assertEqual(converter.extract_metadata_from_png(self.deep_png), "")
+
+    def test_extract_metadata_matches_pillow(self):
+        # 直接读取文本块的结果必须与 Pillow 的 img.info 一致
+        for path in (self.top_png, self.sub_png, self.deep_png):
+            with Image.open(path) as img:
+                expected = img.info.get("parameters", "")
+            self.assertEqual(converter.extract_metadata_from_png(path), expected)
+
+    def test_process_single_image_png(self):
+        result = converter.process_single_image(self.top_png)
+        self.assertEqual(result["所在文件夹"], self.root)
+        self.assertEqual(result["正面提示词"], _PROMPT_ENDING_IN_STOP_WORDS)
+        self.assertEqual(result["负面提示词"], "lowres, bad anatomy")
+        self.assertTrue(result["其他设置"].startswith("Steps: 28, Sampler: Euler a"))
+        self.assertEqual(result["模型"], "testModel_v1")
+        self.assertEqual(result["正面提示词字数"], len(_PROMPT_ENDING_IN_STOP_WORDS))
+        self.assertEqual(result["提取正向词的核心词"], "1girl,")
+        self.assertNotIn("\n", result["去掉换行符的生成信息"])
+
+    def test_process_single_image_without_sd_info(self):
+        result = converter.process_single_image(self.deep_png)
+        self.assertEqual(result["stable diffusion的 ai图片的生成信息"], "没有扫描到生成信息")
+        self.assertEqual(result["提取正向词的核心词"], "核心词为空")
+        self.assertEqual(result["模型"], "未找到模型")
+
+    def test_process_single_image_ignores_unsupported_and_missing_files(self):
+        self.assertIsNone(converter.process_single_image(os.path.join(self.root, "notes.txt")))
+        self.assertIsNone(converter.process_single_image(os.path.join(self.root, "missing.png")))
+
+    def test_process_single_image_reads_converted_jpg(self):
+        output_path, raw_metadata, written_metadata = converter.convert_and_write_metadata(
+            self.top_png, None, "jpg", "PNG转JPG", self.root, 2, 0.0, 0.0)
+        self.assertIsNotNone(output_path)
+        self.assertEqual(written_metadata, raw_metadata)
+        result = converter.process_single_image(output_path)
+        self.assertEqual(result["模型"], "testModel_v1")
+        self.assertEqual(result["提取正向词的核心词"], "1girl,")
+
+
+if __name__ == "__main__":
+    unittest.main()